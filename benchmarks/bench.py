@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.tools import get_array_from_file, normalize, label2rgb, logits2rgb, get_palette
+from utils.item import ImageItem, SegmentationItem, LogitsItem
+from utils.compositor import Compositor
+from utils.render import render_slice
+from utils.volume_cache import VolumeCache
+
+
+# Micro-benchmarks of the load and render hot paths on synthetic volumes.
+# Run from the repository root:
+#   python -m benchmarks.bench --sizes small ct --classes 5 19          compare against the baseline
+#   python -m benchmarks.bench --save                                    record a new baseline
+# Baselines are machine specific and not committed, record one per machine before comparing.
+# Comparing without a baseline fails.
+
+SIZES = {
+    "small": (32, 128, 128),
+    "ct": (300, 512, 512),
+    "large": (800, 1024, 1024),
+}
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+LOGITS_DEPTH = 8  # logits are (C, LOGITS_DEPTH, H, W), full-depth logits of large shapes do not fit in memory
+MIN_TIME_DELTA = 1e-3  # s, slower by less than this is noise
+MIN_MEMORY_DELTA = 1024 * 1024  # bytes
+
+
+def synthetic_volume(shape, seed=0):
+    # CT-like int16: air around an elliptic body of soft-tissue values
+    rng = np.random.default_rng(seed)
+    d, h, w = shape
+    yy, xx = np.mgrid[:h, :w]
+    body = ((yy - h / 2) ** 2 / (0.4 * h) ** 2 + (xx - w / 2) ** 2 / (0.45 * w) ** 2) < 1
+    arr = np.full(shape, -1000, dtype=np.int16)
+    for i in range(d):
+        arr[i][body] = rng.integers(-100, 300, body.sum(), dtype=np.int16)
+    return arr
+
+
+def synthetic_labels(shape, num_classes, seed=1):
+    rng = np.random.default_rng(seed)
+    d, h, w = shape
+    # blocky labels, runs of equal values like a real segmentation
+    coarse = rng.integers(0, num_classes + 1, (d, max(1, h // 16), max(1, w // 16)), dtype=np.uint8)
+    return np.repeat(np.repeat(coarse, 16, axis=1), 16, axis=2)[:, :h, :w].copy()
+
+
+def synthetic_logits(shape, num_classes, path, seed=2):
+    # written slab by slab to a .npy and reopened as a memmap, like logits files in the viewer
+    rng = np.random.default_rng(seed)
+    d, h, w = shape
+    arr = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(num_classes, min(d, LOGITS_DEPTH), h, w))
+    for cls in range(num_classes):
+        arr[cls] = rng.standard_normal(arr.shape[1:], dtype=np.float32) * 5
+    arr.flush()
+    return np.load(path, mmap_mode="r")
+
+
+def measure(fn, repeat):
+    # (median seconds, peak traced bytes). Tracing slows allocations down,
+    # so the peak comes from one extra traced call.
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return float(np.median(times)), int(peak)
+
+
+def get_stages(shape, num_classes, tmp_dir):
+    d, h, w = shape
+    image = synthetic_volume(shape)
+    labels = synthetic_labels(shape, num_classes)
+    name = "x".join(map(str, shape))
+    logits = synthetic_logits(shape, num_classes, os.path.join(tmp_dir, f"logits_{name}_{num_classes}.npy"))
+    index = min(d, LOGITS_DEPTH) // 2
+
+    import SimpleITK as sitk
+    nii = os.path.join(tmp_dir, f"image_{name}.nii.gz")
+    if not os.path.exists(nii):
+        sitk.WriteImage(sitk.GetImageFromArray(image), nii, useCompression=True)
+    cache = VolumeCache(os.path.join(tmp_dir, "volumes"))
+    cache.put(nii, image, {})
+
+    image_item = ImageItem(image, "image", (-1000, 300))
+    seg_item = SegmentationItem(labels, "seg", num_classes)
+    palette = get_palette(num_classes)
+
+    def logits_item():
+        item = LogitsItem(logits, "logits", range_dict={0: (-25., 25.)})
+        item.threshold_low, item.threshold_high = 0, 25
+        return item
+
+    left, right = logits_item(), logits_item()
+    compositor = Compositor()
+
+    def update_view():
+        # colorized slices are cached, measure the uncached path
+        left.rgb_cache.clear()
+        right.rgb_cache.clear()
+        render_slice(index, compositor, image_item, seg_item, left, right, 0.5)
+
+    stages = {
+        "get_array_from_file": lambda: get_array_from_file(nii),
+        "get_array_from_file (cached)": lambda: get_array_from_file(nii, cache=cache),
+        "normalize (slice)": lambda: normalize(image[index], -1200, 400),
+        "label2rgb (slice)": lambda: label2rgb(labels[index], palette=palette),
+        "label2rgb (volume)": lambda: label2rgb(labels, palette=palette),
+        "logits2rgb (slice)": lambda: logits2rgb(np.asarray(logits[0, index]), "JET", -25., 25.),
+        "logits2rgb (slab)": lambda: logits2rgb(np.asarray(logits[0]), "JET", -25., 25.),
+        "ImageItem.update_arr": image_item.update_arr,
+        "ImageItem.get_slice": lambda: image_item.get_slice(index),
+        # no preset range, the first class's range scan is what opening a logits file costs
+        "LogitsItem()": lambda: LogitsItem(logits, "logits").get_range(),
+        "render_slice": update_view,
+    }
+    return stages, (image_item, seg_item, left, right, index)
+
+
+def bench_update_view(items, repeat):
+    # MainWindow.update_view end to end, offscreen, the composition plus the pixmap upload
+    try:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PySide6.QtWidgets import QApplication
+        from mainWindow import MainWindow
+    except ImportError as e:
+        print(f"skipping MainWindow.update_view: {e}")
+        return None
+    app = QApplication.instance() or QApplication([])
+    image, seg, left, right, index = items
+    win = MainWindow(prefetch_workers=0)
+    win.image, win.seg, win.logits_left, win.logits_right = image, seg, left, right
+    win.index, win.visible = index, True
+
+    def update_view():
+        left.rgb_cache.clear()
+        right.rgb_cache.clear()
+        win.update_view()
+
+    try:
+        return measure(update_view, repeat)
+    finally:
+        win.prefetcher.shutdown()
+
+
+def run(opt):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="viewer_bench_") as tmp_dir:
+        shapes = {name: SIZES[name] for name in opt.sizes}
+        if opt.shape is not None:
+            shapes["custom"] = tuple(opt.shape)
+        for name, shape in shapes.items():
+            for num_classes in opt.classes:
+                stages, items = get_stages(shape, num_classes, tmp_dir)
+                for stage, fn in stages.items():
+                    if opt.stages and not any(s in stage for s in opt.stages):
+                        continue
+                    results[f"{name}/{num_classes}/{stage}"] = measure(fn, opt.repeat)
+                if not opt.stages or any(s in "MainWindow.update_view" for s in opt.stages):
+                    result = bench_update_view(items, opt.repeat)
+                    if result is not None:
+                        results[f"{name}/{num_classes}/MainWindow.update_view"] = result
+                for key in [key for key in results if key.startswith(f"{name}/{num_classes}/")]:
+                    seconds, peak = results[key]
+                    print(f"{key:60s} {seconds * 1000:10.2f} ms {peak / 1024 ** 2:10.1f} MB")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # returns (regressions, keys with no baseline entry)
+    regressions, unmatched = [], []
+    for key, (seconds, peak) in results.items():
+        if key not in baseline:
+            unmatched.append(key)
+            continue
+        base_seconds, base_peak = baseline[key]
+        if seconds > base_seconds * (1 + tolerance) and seconds - base_seconds > MIN_TIME_DELTA:
+            regressions.append(f"{key}: {base_seconds * 1000:.2f} ms -> {seconds * 1000:.2f} ms")
+        if peak > base_peak * (1 + tolerance) and peak - base_peak > MIN_MEMORY_DELTA:
+            regressions.append(f"{key}: {base_peak / 1024 ** 2:.1f} MB -> {peak / 1024 ** 2:.1f} MB")
+    return regressions, unmatched
+
+
+def get_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=["small", "ct"])
+    parser.add_argument('--shape', nargs=3, type=int, default=None, help="an extra D H W shape, like --dummy_data_size")
+    parser.add_argument('--classes', nargs='+', type=int, default=[5, 19])
+    parser.add_argument('--stages', nargs='+', default=None, help="only stages whose name contains one of these")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE)
+    parser.add_argument('--save', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown / memory growth, 0.25 is 25%%")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opt = get_opt()
+    results = run(opt)
+    if opt.save:
+        baseline = {}
+        if os.path.exists(opt.baseline):
+            with open(opt.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(opt.baseline, "w") as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f"baseline saved to {opt.baseline}")
+    elif os.path.exists(opt.baseline):
+        with open(opt.baseline) as f:
+            regressions, unmatched = compare(results, json.load(f), opt.tolerance)
+        if unmatched:
+            print(f"\n{len(unmatched)} stage(s) not in {opt.baseline}, run with --save to add them:")
+            for key in unmatched:
+                print("  " + key)
+        if len(unmatched) == len(results):
+            # renamed stages or another machine's baseline, nothing was checked
+            print(f"no stage matched {opt.baseline}")
+            sys.exit(1)
+        if regressions:
+            print(f"\n{len(regressions)} REGRESSION(S) against {opt.baseline}:")
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
+        print("no regressions")
+    else:
+        # without a baseline nothing was checked, do not pass silently
+        print(f"no baseline at {opt.baseline}, run with --save to record one")
+        sys.exit(1)
@@ -0,0 +1,95 @@
+import argparse
+import os
+import subprocess
+import sys
+
+
+# Startup import-time report, the modules loaded before the window appears.
+# Run from the repository root:
+#   python -m benchmarks.startup                      top modules by cumulative import time
+#   python -m benchmarks.startup --budget 1000        also fail when the imports take longer than 1000 ms
+# Fails when one of the heavy dependencies is imported at startup.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# loaded on first use of the feature needing them, never at startup
+LAZY_MODULES = ["SimpleITK", "cv2", "monai", "torch", "matplotlib", "pandas"]
+# what run.py imports on its way to the window
+STARTUP = "import run, mainWindow; from PySide6.QtWidgets import QApplication"
+WINDOW = """
+import time
+start = time.perf_counter()
+import run, mainWindow
+from PySide6.QtWidgets import QApplication
+app = QApplication([])
+window = mainWindow.MainWindow(prefetch_workers=0)
+window.show()
+app.processEvents()
+print(f"{(time.perf_counter() - start) * 1000:.1f}")
+window.prefetcher.shutdown()
+"""
+
+
+def get_env():
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    return env
+
+
+def import_times():
+    # {module: (self us, cumulative us, depth)} from -X importtime, written to stderr
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", STARTUP], cwd=ROOT, env=get_env(),
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        # nesting is two spaces per level after the separator's one
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times.setdefault(name.strip(), (int(self_us), int(cumulative), depth))
+    return times
+
+
+def window_time():
+    # ms from the first import to a shown, empty window
+    proc = subprocess.run([sys.executable, "-c", WINDOW], cwd=ROOT, env=get_env(), capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(f"skipping time to window: {proc.stderr.strip().splitlines()[-1]}")
+        return None
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def get_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--top', type=int, default=20, help="modules listed, by cumulative time")
+    parser.add_argument('--budget', type=float, default=None, help="ms allowed for the startup imports")
+    parser.add_argument('--window', action='store_true', help="also time the first shown window")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opt = get_opt()
+    times = import_times()
+    # nested imports are part of their importer's cumulative time, only the outermost add up
+    total = sum(cumulative for _, cumulative, depth in times.values() if depth == 0) / 1000
+    # packages only, a submodule's time is already in its package's cumulative time
+    packages = {name: t for name, t in times.items() if "." not in name}
+    for name, (self_us, cumulative, _) in sorted(packages.items(), key=lambda x: -x[1][1])[:opt.top]:
+        print(f"{name:40s} {cumulative / 1000:10.1f} ms {self_us / 1000:10.1f} ms self")
+    print(f"{'total':40s} {total:10.1f} ms, {len(times)} modules")
+    if opt.window:
+        ms = window_time()
+        if ms is not None:
+            print(f"{'time to window':40s} {ms:10.1f} ms")
+
+    failures = [f"{name} is imported at startup" for name in LAZY_MODULES if name in times]
+    if opt.budget is not None and total > opt.budget:
+        failures.append(f"startup imports take {total:.1f} ms, the budget is {opt.budget:.1f} ms")
+    if failures:
+        print(f"\n{len(failures)} REGRESSION(S):")
+        for failure in failures:
+            print("  " + failure)
+        sys.exit(1)
+    print("no regressions")
@@ -1,39 +1,52 @@
+import os
+import time
 from functools import partial
 from typing import Optional
 
 import PySide6
 from PySide6 import QtGui, QtCore
-from PySide6.QtWidgets import QApplication, QWidget, QFileDialog, QGraphicsScene, QSplitter, QTableWidget
+from PySide6.QtWidgets import QApplication, QWidget, QFileDialog, QGraphicsScene, QSplitter, QTableWidget, \
+    QVBoxLayout, QListWidget, QListWidgetItem, QComboBox, QTableWidgetItem, QGraphicsView, QGraphicsLineItem, \
+    QLabel
 from PySide6.QtGui import QPixmap, QImage, QShortcut, QKeySequence, QStandardItemModel
 from PySide6.QtCore import Qt, QModelIndex
-from PIL import Image, ImageQt
-import pandas as pd
 
 from ui import tool_bar, viewer, logits_statistics
 from utils.item import *
 from utils.datareader import DataReader
+from utils.compositor import Compositor
+from utils.render import render_slice, orient_logits, choose_crop
+from utils.profiler import profiler
+from utils.display import array2qpixmap
+from utils.scheduler import RenderScheduler
+from utils.prefetch import SlicePrefetcher
+from utils.volume_cache import VolumeCache
+from utils.occupancy import OccupancyIndex
+from utils.compare import Disagreement, disagreement_mask, DISAGREEMENT_COLOR
+from utils.metrics import Confusion
+from utils.planes import PlaneCache, DEFAULT_PLANE_CACHE_SIZE, CORONAL, SAGITTAL
+from utils.loader import Loader, load_volume, load_range, load_segmentation, load_logits, load_logits_stats, \
+    load_label_occupancy, load_logits_occupancy, load_disagreement, load_confusion, load_threshold_confusion, \
+    load_planes
 
 
 class TableModel(QtCore.QAbstractTableModel):
 
-    def __init__(self, data):
+    def __init__(self, num_rows, columns=('Left', 'Right')):
         super(TableModel, self).__init__()
-        self._data: pd.DataFrame = data
+        self.columns = list(columns)
+        # values are updated in place, only changed cells are repainted
+        self._data = np.zeros((num_rows, len(self.columns)), dtype=np.float32)
+        self._highlight = np.zeros(self._data.shape, dtype=bool)
 
     def data(self, index, role):
         if role == Qt.DisplayRole:
-            value = self._data.iloc[index.row(), index.column()]
-
-            if isinstance(value, (float, np.float32)):
-                return "%.3f" % value
-
-            return str(value)
+            value = self._data[index.row(), index.column()]
+            # nan marks classes the loaded file does not have
+            return "" if np.isnan(value) else "%.3f" % value
 
         if role == Qt.BackgroundRole:
-            # See below for the data structure.
-            if not self._data.values.sum():
-                return QtGui.QColor('#202020')
-            elif self._data.iloc[index.row(), index.column()] == self._data.iloc[:, index.column()].max():
+            if self._highlight[index.row(), index.column()]:
                 return QtGui.QColor('#A52A2A')
             else:
                 return QtGui.QColor('#202020')
@@ -48,15 +61,30 @@ class TableModel(QtCore.QAbstractTableModel):
         # section is the index of the column/row.
         if role == Qt.DisplayRole:
             if orientation == Qt.Horizontal:
-                return str(self._data.columns[section])
+                return self.columns[section]
 
             if orientation == Qt.Vertical:
-                return str(self._data.index[section])
+                return str(section)
 
     def set_data(self, data):
-        self.beginResetModel()
-        self._data = data
-        self.endResetModel()
+        data = np.asarray(data, dtype=np.float32)[:self._data.shape[0]]
+        changed = np.zeros(self._data.shape, dtype=bool)
+        old = self._data[:len(data)]
+        changed[:len(data)] = (old != data) & ~(np.isnan(old) & np.isnan(data))
+        self._data[:len(data)] = data
+
+        # the per-column max is found once per probe, not once per painted cell
+        highlight = np.zeros(self._data.shape, dtype=bool)
+        if np.nan_to_num(self._data).any():
+            # nan rows are never the max
+            highlight = self._data == np.where(np.isnan(self._data), -np.inf, self._data).max(axis=0)
+        changed |= highlight != self._highlight
+        self._highlight = highlight
+
+        for column in np.flatnonzero(changed.any(axis=0)):
+            rows = np.flatnonzero(changed[:, column])
+            self.dataChanged.emit(self.index(rows[0], column), self.index(rows[-1], column),
+                                  [Qt.DisplayRole, Qt.BackgroundRole])
 
 
 class Viewer(QWidget, viewer.Ui_Form):
@@ -66,6 +94,220 @@ class Viewer(QWidget, viewer.Ui_Form):
         self.setupUi(self)
 
 
+class OccupancyStrip(QWidget):
+    # marks the slices that contain the current class along the depth scrollbar
+
+    def __init__(self, parent=None):
+        super(OccupancyStrip, self).__init__(parent)
+        self.setFixedHeight(6)
+        self.occupancy: np.ndarray = None
+
+    def set_occupancy(self, occupancy):
+        self.occupancy = occupancy
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), QtGui.QColor('#202020'))
+        if self.occupancy is None or not len(self.occupancy):
+            return
+        d = len(self.occupancy)
+        # draw runs of occupied slices rather than one rect per slice
+        edges = np.diff(np.concatenate([[0], self.occupancy.astype(np.int8), [0]]))
+        starts, stops = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        width = self.width()
+        for start, stop in zip(starts, stops):
+            x0 = int(start * width / d)
+            x1 = max(x0 + 1, int(stop * width / d))
+            painter.fillRect(x0, 0, x1 - x0, self.height(), QtGui.QColor('#A52A2A'))
+
+
+class Crosshair:
+    # a horizontal and a vertical line through a voxel, in the coordinates of a pixmap item
+
+    def __init__(self, parent):
+        pen = QtGui.QPen(QtGui.QColor('#FFFF00'))
+        pen.setCosmetic(True)
+        self.lines = [QGraphicsLineItem(parent), QGraphicsLineItem(parent)]
+        for line in self.lines:
+            line.setPen(pen)
+            line.setVisible(False)
+
+    def set_position(self, row, column, height, width, scale=1.):
+        self.lines[0].setLine(0, (row + 0.5) * scale, width * scale, (row + 0.5) * scale)
+        self.lines[1].setLine((column + 0.5) * scale, 0, (column + 0.5) * scale, height * scale)
+
+    def setVisible(self, visible):
+        for line in self.lines:
+            line.setVisible(visible)
+
+
+class PlaneView(QGraphicsView):
+    # a coronal or sagittal slice, rows are depth, scaled by the slice spacing
+
+    clicked = QtCore.Signal(int, int)  # row, column in voxels
+
+    def __init__(self, parent=None):
+        super(PlaneView, self).__init__(parent)
+        self.setScene(QGraphicsScene(self))
+        self.setBackgroundBrush(QtGui.QColor('#000000'))
+        self.pixmap = QPixmap()
+        self.pixmapItem = self.scene().addPixmap(self.pixmap)
+        self.crosshair = Crosshair(self.pixmapItem)
+        self.crosshair.setVisible(True)
+        self.aspect: float = 1.
+
+    def set_image(self, im, aspect):
+        size = self.pixmap.size()
+        self.pixmap = array2qpixmap(im)
+        self.pixmapItem.setPixmap(self.pixmap)
+        if aspect != self.aspect or size != self.pixmap.size():
+            self.aspect = aspect
+            self.pixmapItem.setTransform(QtGui.QTransform.fromScale(1, aspect))
+            self.fit()
+
+    def fit(self):
+        self.scene().setSceneRect(self.pixmapItem.sceneBoundingRect())
+        self.fitInView(self.pixmapItem, Qt.KeepAspectRatio)
+
+    def resizeEvent(self, event):
+        super(PlaneView, self).resizeEvent(event)
+        self.fit()
+
+    def mousePressEvent(self, event):
+        pos = self.pixmapItem.mapFromScene(self.mapToScene(event.position().toPoint()))
+        row, column = int(pos.y()), int(pos.x())
+        if 0 <= row < self.pixmap.height() and 0 <= column < self.pixmap.width():
+            self.clicked.emit(row, column)
+
+
+class DisagreementWindow(QWidget):
+    # slices ranked by left / right argmax disagreement, activating a row jumps to it
+
+    jump = QtCore.Signal(int)
+
+    def __init__(self):
+        super(DisagreementWindow, self).__init__()
+        self.setWindowTitle("Left / right disagreement")
+        self.resize(270, 656)
+        self.layout = QVBoxLayout(self)
+        self.listWidget = QListWidget(self)
+        self.layout.addWidget(self.listWidget)
+        self.listWidget.itemActivated.connect(lambda item: self.jump.emit(item.data(Qt.UserRole)))
+
+    def set_disagreement(self, disagreement, cls):
+        self.listWidget.clear()
+        if disagreement is None:
+            return
+        has_cls = cls < disagreement.class_diff.shape[0]
+        for index in disagreement.order:
+            text = f"slice {index:4d}    {100 * disagreement.score[index]:6.2f}%"
+            if has_cls:
+                text += f"    |d{cls}| {disagreement.class_diff[cls, index]:.3f}"
+            item = QListWidgetItem(text)
+            item.setData(Qt.UserRole, int(index))
+            self.listWidget.addItem(item)
+
+
+class DiceCurve(QWidget):
+    # per-slice Dice of the current class, left in red and right in blue, with the current slice marked
+
+    def __init__(self, parent=None):
+        super(DiceCurve, self).__init__(parent)
+        self.setMinimumHeight(120)
+        self.curves: list = []
+        self.index: int = 0
+
+    def set_curves(self, curves, index):
+        self.curves = curves
+        self.set_index(index)
+
+    def set_index(self, index):
+        self.index = index
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), QtGui.QColor('#202020'))
+        width, height = self.width() - 1, self.height() - 1
+        for curve, color in zip(self.curves, ('#FF4040', '#4080FF')):
+            if curve is None or len(curve) < 2:
+                continue
+            painter.setPen(QtGui.QColor(color))
+            # slices without the class on either side have no Dice, break the line there
+            xs = np.arange(len(curve)) * width / (len(curve) - 1)
+            ys = height - np.nan_to_num(curve, nan=-1) * height
+            path = QtGui.QPainterPath()
+            pen_down = False
+            for x, y, valid in zip(xs, ys, ~np.isnan(curve)):
+                if valid and pen_down:
+                    path.lineTo(x, y)
+                elif valid:
+                    path.moveTo(x, y)
+                pen_down = valid
+            painter.drawPath(path)
+        if self.curves and self.curves[0] is not None and len(self.curves[0]) > 1:
+            painter.setPen(QtGui.QColor('#A0A0A0'))
+            x = self.index * width / (len(self.curves[0]) - 1)
+            painter.drawLine(int(x), 0, int(x), height)
+
+
+class MetricsWindow(QWidget):
+    # Dice / IoU / volume between the segmentation and the left / right logits
+
+    ARGMAX = "Argmax, all classes"
+    THRESHOLD = "Threshold, current class"
+
+    def __init__(self):
+        super(MetricsWindow, self).__init__()
+        self.setWindowTitle("Metrics")
+        self.resize(760, 656)
+        self.layout = QVBoxLayout(self)
+        self.comboBox_mode = QComboBox(self)
+        self.comboBox_mode.addItems([self.ARGMAX, self.THRESHOLD])
+        self.tableWidget = QTableWidget(self)
+        self.tableWidget.setColumnCount(10)
+        self.tableWidget.setHorizontalHeaderLabels(
+            ["Class", "GT voxels", "GT ml", "Dice L", "IoU L", "Voxels L", "Dice R", "IoU R", "Voxels R", "ml L / R"])
+        self.tableWidget.verticalHeader().setVisible(False)
+        self.diceCurve = DiceCurve(self)
+        self.layout.addWidget(self.comboBox_mode)
+        self.layout.addWidget(self.tableWidget)
+        self.layout.addWidget(self.diceCurve)
+
+    def threshold_mode(self):
+        return self.comboBox_mode.currentText() == self.THRESHOLD
+
+    def set_metrics(self, left: Confusion, right: Confusion, cls, index, voxel_ml):
+        confusion = left if left is not None else right
+        if confusion is None:
+            self.tableWidget.setRowCount(0)
+            self.diceCurve.set_curves([], index)
+            return
+        # thresholded metrics are binary, class 1 is the current class
+        classes = [1] if self.threshold_mode() else list(range(confusion.num_classes))
+        names = [cls] if self.threshold_mode() else classes
+        _, gt, _ = confusion.totals()
+        sides = [(c.dice(), c.iou(), c.totals()[2]) if c is not None else None for c in (left, right)]
+
+        def cell(value, fmt="%.4f"):
+            return "-" if value is None or np.isnan(value) else fmt % value
+
+        self.tableWidget.setRowCount(len(classes))
+        for row, (c, name) in enumerate(zip(classes, names)):
+            values = [str(name), cell(gt[c], "%d"), cell(gt[c] * voxel_ml, "%.2f")]
+            for side in sides:
+                values += ["-"] * 3 if side is None else [cell(side[0][c]), cell(side[1][c]), cell(side[2][c], "%d")]
+            values.append(" / ".join("-" if side is None else "%.2f" % (side[2][c] * voxel_ml) for side in sides))
+            for column, value in enumerate(values):
+                self.tableWidget.setItem(row, column, QTableWidgetItem(value))
+
+        curve_cls = 1 if self.threshold_mode() else cls
+        self.diceCurve.set_curves([c.dice(per_slice=True)[curve_cls]
+                                   if c is not None and curve_cls < c.num_classes else None for c in (left, right)],
+                                  index)
+
+
 class LogitsWindow(QWidget, logits_statistics.Ui_Form):
 
     def __init__(self, parent: Optional[PySide6.QtWidgets.QWidget] = ..., f: PySide6.QtCore.Qt.WindowType = ...) -> None:
@@ -74,17 +316,27 @@ class LogitsWindow(QWidget, logits_statistics.Ui_Form):
 
 class MainWindow(QWidget, tool_bar.Ui_Form):
 
-    def __init__(self, num_classes=19, dummy_data_size=None):
+    def __init__(self, num_classes=19, dummy_data_size=None, cache_size=DEFAULT_CACHE_SIZE,
+                 prefetch_workers=2, prefetch_depth=8, volume_cache=None, plane_cache_size=DEFAULT_PLANE_CACHE_SIZE,
+                 pyramid_cache_size=DEFAULT_PYRAMID_CACHE_SIZE):
         super().__init__()
         self.setupUi(self)
         self.viewer = Viewer()
         self.logitsWindow = LogitsWindow()
-        self.initial(num_classes, dummy_data_size)
+        self.disagreementWindow = DisagreementWindow()
+        self.metricsWindow = MetricsWindow()
+        self.volume_cache: VolumeCache = volume_cache
+        self.plane_cache = PlaneCache(plane_cache_size)
+        self.pyramid_cache_size: int = pyramid_cache_size  # per item
+        self.initial(num_classes, dummy_data_size, cache_size, prefetch_workers, prefetch_depth)
         self.bind()
 
-    def initial(self, num_classes, dummy_data_size):
+    def initial(self, num_classes, dummy_data_size, cache_size, prefetch_workers, prefetch_depth):
 
         self.ratio = 2  # 缩放初始比例
+        self.level = 0  # pyramid level, slices are composited at 1 / 2 ** level resolution
+        self.crop = None  # (rows, columns) slices of the region composited when zoomed in
+        self.crop_margin = 0.25  # extra composited area around the viewport, per side, relative to its size
         self.zoom_step = 0.1  # 缩放步长
         self.zoom_max = 10  # 缩放最大值
         self.zoom_min = 0.2  # 缩放最小值
@@ -102,11 +354,39 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
         self.logits_right: LogitsItem = None
         self.logits_init: bool = False
         self.logits_opacity: float = 0.5
+        self.seg_occupancy: OccupancyIndex = None
+        # per pane, the current class as thresholded in the overlay
+        self.logits_occupancy: dict = {"left": None, "right": None}
+        self.occupancy_keys: dict = {}
+        self.occupancy_tasks: dict = {}
+        self.disagreement: Disagreement = None
+        self.disagreement_visible: bool = False
+        self.disagreement_rank: int = -1
+        self.metrics: dict = {"left": None, "right": None}
+        self.metrics_keys: dict = {}
+        self.metrics_tasks: dict = {}
+        self.metrics_results: dict = {}
+        self.planes_visible: bool = False
+        self.plane_tokens: tuple = ()  # the sources the plane cache was last planned for
+        self.plane_compositors = {CORONAL: Compositor(), SAGITTAL: Compositor()}
         self.num_classes: int = num_classes
+        self.cache_size: int = cache_size
+        self.compositor = Compositor()
+        self.scheduler = RenderScheduler(self.update_view, parent=self)
+        # hover updates are throttled to roughly the display refresh rate
+        self.hover_scheduler = RenderScheduler(self.update_property, interval=16, parent=self)
+        self.prefetcher = SlicePrefetcher(self.compose_slice, self.get_render_params, prefetch_workers, prefetch_depth)
+        self.loader = Loader(self)
+        # thresholds move in small steps while dragging, the full-volume scans start once they
+        # have settled for 250 ms
+        self.metrics_scheduler = RenderScheduler(self.update_metrics, interval=250, parent=self, debounce=True)
+        self.occupancy_scheduler = RenderScheduler(self.update_logits_occupancy, interval=250, parent=self,
+                                                   debounce=True)
+        self.plane_scheduler = RenderScheduler(self.update_planes, interval=16, parent=self)
 
         if dummy_data_size is not None:
             arr =np.zeros(dummy_data_size)
-            self.image = ImageItem(arr, "dummy_data")
+            self.image = ImageItem(arr, "dummy_data", pyramid_cache_size=self.pyramid_cache_size)
             self.index = dummy_data_size[0] - 1
             self.set_image_property()
             self.visible = True
@@ -140,7 +420,42 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
                                             self.viewer.graphicsView_right.height())
         self.viewer.graphicsView_right.setScene(self.scene_right)
 
+        self.pixmap_left = QPixmap()
+        self.pixmapItem_left = self.scene_left.addPixmap(self.pixmap_left)
+        self.pixmapItem_left.setScale(self.ratio)
+        self.pixmap_right = QPixmap()
+        self.pixmapItem_right = self.scene_right.addPixmap(self.pixmap_right)
+        self.pixmapItem_right.setScale(self.ratio)
+
+        self.crosshair_left = Crosshair(self.pixmapItem_left)
+        self.crosshair_right = Crosshair(self.pixmapItem_right)
+
+        # coronal / sagittal views to the right of the axial panes, hidden until toggled
+        self.planeSplitter = QSplitter(Qt.Vertical, self.viewer.splitter)
+        self.coronalView = PlaneView(self.planeSplitter)
+        self.sagittalView = PlaneView(self.planeSplitter)
+        self.planeSplitter.addWidget(self.coronalView)
+        self.planeSplitter.addWidget(self.sagittalView)
+        self.viewer.splitter.addWidget(self.planeSplitter)
+        self.planeSplitter.hide()
+
+        # F2: frame rate and per-stage timings over the left pane, F3: dump a Chrome trace
+        self.hud = QLabel(self.viewer.graphicsView_left)
+        self.hud.setStyleSheet("background-color: rgba(0, 0, 0, 160); color: #E0E0E0; padding: 4px;")
+        self.hud.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        self.hud.move(8, 8)
+        self.hud.hide()
+        self.hud_timer = QtCore.QTimer(self)
+        self.hud_timer.setInterval(250)
+        self.hud_timer.timeout.connect(self.update_hud)
+        self.coronalView.clicked.connect(lambda row, column: self.set_cursor(row, self.h, column))
+        self.sagittalView.clicked.connect(lambda row, column: self.set_cursor(row, column, self.w))
+        for view in (self.coronalView, self.sagittalView):
+            view.keyPressEvent = self.keyPressEvent
+
         self.viewer.mainScrollBar.valueChanged.connect(self.depth_scrollbar_handler)
+        self.occupancyStrip = OccupancyStrip(self.viewer)
+        self.viewer.verticalLayout_veiw.insertWidget(1, self.occupancyStrip)
 
         # Volume
         self.pushButton.clicked.connect(self.open_file)
@@ -168,96 +483,253 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
 
         self.comboBox_logits_style.currentTextChanged.connect(self.set_logits_style)
 
-        data = pd.DataFrame([[0, 0] for _ in range(self.num_classes)], columns=['Left', 'Right'], index=[str(cls) for cls in range(self.num_classes)])
-        self.model = TableModel(data)
+        self.model = TableModel(self.num_classes)
+        self.probe = np.zeros((self.num_classes, 2), dtype=np.float32)
         self.logitsWindow.tableView_property.setModel(self.model)
 
         QShortcut(QKeySequence("Ctrl+w"), self).activated.connect(self.exit_)
         QShortcut(QKeySequence("Ctrl+w"), self.viewer).activated.connect(self.viewer_hide)
         QShortcut(QKeySequence("Ctrl+w"), self.logitsWindow).activated.connect(self.logitsWindow_hide)
         QShortcut(QKeySequence("Ctrl+s"), self).activated.connect(self.show_)
+        QShortcut(QKeySequence("Ctrl+d"), self).activated.connect(self.showDisagreementWindow)
+        QShortcut(QKeySequence("Ctrl+d"), self.viewer).activated.connect(self.showDisagreementWindow)
+        QShortcut(QKeySequence("Ctrl+w"), self.disagreementWindow).activated.connect(self.disagreementWindow.hide)
+        self.disagreementWindow.jump.connect(self.viewer.mainScrollBar.setValue)
+        QShortcut(QKeySequence("Ctrl+m"), self).activated.connect(self.showMetricsWindow)
+        QShortcut(QKeySequence("Ctrl+m"), self.viewer).activated.connect(self.showMetricsWindow)
+        QShortcut(QKeySequence("Ctrl+w"), self.metricsWindow).activated.connect(self.metricsWindow.hide)
+        self.metricsWindow.comboBox_mode.currentTextChanged.connect(self.showMetricsWindow)
 
         self.setAcceptDrops(True)
         self.viewer.graphicsView_left.setMouseTracking(True)
         self.viewer.graphicsView_right.setMouseTracking(True)
+        # a larger viewport (window resize, splitter, plane views hidden) exposes voxels outside the crop
+        self.viewer.graphicsView_left.viewport().installEventFilter(self)
+        self.viewer.graphicsView_right.viewport().installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QtCore.QEvent.Resize and self.visible and self.pixmapItem_left is not None:
+            self.update_crop()
+        return super(MainWindow, self).eventFilter(obj, event)
 
     def update_view(self):
         if not self.visible:
             return
 
-        view_slide = self.image.arr[self.index]
-
-        im_left = cv2.cvtColor(view_slide, cv2.COLOR_GRAY2RGB)
-        im_left = np.float32(im_left) / 255
-
+        with profiler.span("update_view"):
+            crop = self.get_crop()
+            if crop != self.crop:
+                # already rendering, only the prefetched frames are stale
+                self.crop = crop
+                self.prefetcher.invalidate()
+            frame = self.prefetcher.take(self.index)
+            if frame is None:
+                with profiler.span("compose"):
+                    frame = self.compose_slice(self.index, self.compositor)
+            self.addScene(*frame)
+            self.prefetcher.update(self.index, self.image.d)
+        profiler.frame()
+
+    def get_render_params(self, snapshot=True):
+        # everything a frame depends on. Prefetch workers get snapshots of the items, so they never
+        # see a half-updated item while the GUI thread changes a threshold or a colormap
+        def get(item):
+            return item.snapshot() if snapshot and item is not None else item
+
+        return (get(self.image), get(self.seg), get(self.logits_left), get(self.logits_right), self.logits_opacity,
+                self.disagreement_visible and self.disagreement is not None, self.level, self.crop)
+
+    def compose_slice(self, index, compositor, params=None):
+        # the GUI thread renders from the live state
+        if params is None:
+            params = self.get_render_params(snapshot=False)
+        image, seg, logits_left, logits_right, logits_opacity, disagreement, level, crop = params
+        overlay = self.get_disagreement_layer(index, logits_left, logits_right, logits_opacity, level, crop) \
+            if disagreement else None
+        return render_slice(index, compositor, image, seg, logits_left, logits_right, logits_opacity, overlay,
+                            level, crop)
+
+    @staticmethod
+    def get_disagreement_layer(index, logits_left, logits_right, opacity, level=0, crop=None):
+        f = 1 << level
+        region = (slice(None),) + (crop if crop is not None else (slice(None, None, f), slice(None, None, f)))
+        mask = disagreement_mask(logits_left.logits[:, index][region], logits_right.logits[:, index][region])
+        return mask, DISAGREEMENT_COLOR, opacity
+
+    def get_visible_rect(self):
+        # voxels visible in either pane, in full-resolution slice coordinates
+        rect = QtCore.QRectF()
+        for view, item in ((self.viewer.graphicsView_left, self.pixmapItem_left),
+                           (self.viewer.graphicsView_right, self.pixmapItem_right)):
+            if view.isVisible():
+                scene_rect = view.mapToScene(view.viewport().rect()).boundingRect()
+                rect = rect.united(item.mapRectFromScene(scene_rect))
+        return rect
+
+    def get_crop(self):
+        if self.level != 0 or self.image is None:
+            return None
+        rect = self.get_visible_rect()
+        if rect.isEmpty():
+            return None
+        h, w = self.image.h, self.image.w
+        y0, y1 = max(0, int(np.floor(rect.top()))), min(h, int(np.ceil(rect.bottom())))
+        x0, x1 = max(0, int(np.floor(rect.left()))), min(w, int(np.ceil(rect.right())))
+        return choose_crop((y0, y1, x0, x1), (h, w), self.crop, self.crop_margin)
+
+    def update_crop(self):
+        crop = self.get_crop()
+        if crop != self.crop:
+            self.crop = crop
+            self.state_changed()
+
+    def update_level(self):
+        # zoomed out, composite a downsampled slice and let the pixmap item scale it back up
+        level = get_level(self.ratio, (self.image.h, self.image.w))
+        self.pixmapItem_left.setScale(self.ratio * (1 << level))
+        self.pixmapItem_right.setScale(self.ratio * (1 << level))
+        if level != self.level:
+            self.level = level
+            self.state_changed()
+        self.update_crop()
+
+    def set_hud_visible(self, visible):
+        # the profiler only records while the HUD is shown
+        profiler.set_enabled(visible)
+        self.hud.setVisible(visible)
+        if visible:
+            self.hud_timer.start()
+            self.update_hud()
+        else:
+            self.hud_timer.stop()
+
+    def update_hud(self):
+        lines = [f"{profiler.fps():3d} fps"]
+        breakdown = profiler.breakdown()
+        for name in sorted(breakdown, key=lambda name: -breakdown[name][0]):
+            ms, calls = breakdown[name]
+            lines.append(f"{name:18s} {ms:7.2f} ms  x{calls}")
+        self.hud.setText("\n".join(lines))
+        self.hud.adjustSize()
+
+    def dump_trace(self):
+        if not profiler.events:
+            print("no spans recorded, press F2 to start profiling")
+            return
+        file_name = time.strftime("viewer_trace_%Y%m%d_%H%M%S.json")
+        count = profiler.dump(file_name)
+        print(f"{count} spans written to {os.path.abspath(file_name)}")
+
+    def state_changed(self):
+        # rendering parameters changed: drop prefetched frames and redraw
+        self.prefetcher.invalidate()
+        self.scheduler.request()
+        self.request_planes()
+
+    def request_planes(self):
+        if self.planes_visible:
+            self.plane_scheduler.request()
+
+    def set_planes_visible(self, visible):
+        self.planes_visible = visible and self.visible
+        self.planeSplitter.setVisible(self.planes_visible)
+        self.crosshair_left.setVisible(self.planes_visible)
+        self.crosshair_right.setVisible(self.planes_visible)
+        self.update_crop()
+        self.request_planes()
+
+    def set_cursor(self, index, h, w):
+        self.h, self.w = h, w
+        self.viewer.mainScrollBar.setValue(index)
+        self.hover_scheduler.request()
+        self.request_planes()
+
+    def update_planes(self):
+        if not self.planes_visible or not self.visible:
+            return
+        sources = self.get_plane_sources()
+        tokens = tuple(source.token for source in sources)
+        if tokens != self.plane_tokens:
+            # only when a volume is loaded or the class changes, not on every cursor move
+            self.plane_tokens = tokens
+            self.prepare_planes(sources)
+        sx, sy, sz = self.image.spacing[:3]
+        for axis, view, index, column, aspect in ((CORONAL, self.coronalView, self.h, self.w, sz / sx),
+                                                  (SAGITTAL, self.sagittalView, self.w, self.h, sz / sy)):
+            im, _ = self.compose_plane(axis, index, self.plane_compositors[axis])
+            view.set_image(im, aspect)
+            view.crosshair.set_position(self.index, column, *im.shape[:2])
+        # the axial pixmaps may be a pyramid level, their crosshairs are drawn in its pixels
+        scale = 1 / (1 << self.level)
+        self.crosshair_left.set_position(self.h, self.w, self.image.h, self.image.w, scale)
+        self.crosshair_right.set_position(self.h, self.w, self.image.h, self.image.w, scale)
+
+    def compose_plane(self, axis, index, compositor):
+        # the left pane's layers along a coronal / sagittal plane
+        seg_rgb = None
         if self.seg is not None and self.seg.visible:
-            seg = self.seg.rgb[self.index]
-            seg = np.float32(seg) / 255
-            im_left[seg > 0] = im_left[seg > 0] * self.seg.opacity
-            im_left = im_left + seg * (1 - self.seg.opacity)
-
-        im_right = im_left.copy()
+            seg_rgb = self.seg.get_plane_rgb(axis, index)
+        logits = None
         if self.logits_left is not None and self.logits_left.visible:
+            logits = (self.logits_left.get_plane(axis, index), self.logits_left.get_plane_rgb(axis, index),
+                      self.logits_left.threshold_low, self.logits_left.threshold_high)
+        return compositor.compose(
+            self.image.get_plane(axis, index),
+            seg_rgb, self.seg.opacity if seg_rgb is not None else 0,
+            logits, None, self.logits_opacity)
+
+    def get_plane_sources(self):
+        sources = [item.planes for item in (self.image, self.seg) if item is not None]
+        if self.logits_left is not None:
+            sources.append(self.logits_left.get_planes())
+        return sources
 
-            logits = self.logits_left.arr[self.index]
-            mask = (logits >= self.logits_left.threshold_low) & (logits <= self.logits_left.threshold_high)
-            logits_rgb = self.logits_left.rgb[self.index]
-            logits_rgb = np.float32(logits_rgb) / 255
-            # mask = mask & self.logits_left.mask[self.index]
-            im_left[mask] = im_left[mask] * self.logits_opacity
-            im_left = im_left + logits_rgb * (1 - self.logits_opacity) * mask[..., None]
-
-        if self.logits_right is not None and self.logits_right.visible:
-            logits = self.logits_right.arr[self.index]
-            mask = (logits >= self.logits_right.threshold_low) & (logits <= self.logits_right.threshold_high)
-            logits_rgb = self.logits_right.rgb[self.index]
-            logits_rgb = np.float32(logits_rgb) / 255
-            # mask = mask & self.logits_right.mask[self.index]
-            im_right[mask] = im_right[mask] * self.logits_opacity
-            im_right = im_right + logits_rgb * (1 - self.logits_opacity) * mask[..., None]
-            im_right = logits_rgb * mask[..., None]
-
-        im_right = Image.fromarray(np.uint8(255 * im_right))
-        im_left = Image.fromarray(np.uint8(255 * im_left))
-        self.addScene(im_left, im_right)
-
-    def addScene(self, im_left, im_right):
-        if self.pixmapItem_left != None:
-            originX = self.pixmapItem_left.x()
-            originY = self.pixmapItem_left.y()
-        else:
-            originX, originY = 0, 0
-
-        self.scene_left.clear()
-        self.scene_right.clear()
+    def prepare_planes(self, sources):
+        # reoriented copies of what is shown are built in the background, as far as the budget goes
+        for source, axes in self.plane_cache.plan(sources):
+            self.loader.submit(load_planes, source, axes, label="Reorienting volume",
+                               on_finished=partial(self.set_plane_copies, source),
+                               on_failed=lambda message, source=source: self.plane_cache.release(source), quiet=True)
 
-        self.pixmap_left = ImageQt.toqpixmap(im_left)
-        self.pixmapItem_left = self.scene_left.addPixmap(self.pixmap_left)
-        self.pixmapItem_left.setScale(self.ratio)
-        self.pixmapItem_left.setPos(originX, originY)
+    def set_plane_copies(self, source, copies):
+        self.plane_cache.put(source, copies)
 
-        self.pixmap_right = ImageQt.toqpixmap(im_right)
-        self.pixmapItem_right = self.scene_right.addPixmap(self.pixmap_right)
-        self.pixmapItem_right.setScale(self.ratio)
-        self.pixmapItem_right.setPos(originX, originY)
+    def addScene(self, im_left, im_right):
+        # the pixmap items persist, only their pixmaps are swapped.
+        # A cropped frame is drawn at its offset in the full slice.
+        offset = QtCore.QPointF(0, 0)
+        if self.crop is not None:
+            offset = QtCore.QPointF(self.crop[1].start, self.crop[0].start)
+        with profiler.span("upload"):
+            self.pixmap_left = array2qpixmap(im_left)
+            self.pixmapItem_left.setPixmap(self.pixmap_left)
+            self.pixmapItem_left.setOffset(offset)
+
+            self.pixmap_right = array2qpixmap(im_right)
+            self.pixmapItem_right.setPixmap(self.pixmap_right)
+            self.pixmapItem_right.setOffset(offset)
 
     def update_property(self):
         if not self.visible:
             return
+        with profiler.span("update_property"):
+            self.probe_cursor()
+
+    def probe_cursor(self):
         intensity = ""
         cls = ""
         d, h, w = self.index, self.h, self.w
         if self.image is not None:
-            intensity = self.image._arr[d, h, w]
+            intensity = self.image.arr[d, h, w]
         if self.seg is not None:
             cls = self.seg.arr[d, h, w]
         if self.logits_left is not None:
-
-            logits_left = [logits[d, h, w] for logits in self.logits_left.dict.values()]
-            logits_right = [logits[d, h, w] for logits in self.logits_right.dict.values()]
-            data = pd.DataFrame(np.array([logits_left, logits_right]).transpose(), columns=['Left', 'Right'],
-                                index=[str(cls) for cls in range(self.num_classes)])
-            self.model.set_data(data)
+            for column, logits in enumerate([self.logits_left, self.logits_right]):
+                values = logits.probe(d, h, w)[:self.num_classes] if logits is not None else []
+                self.probe[:len(values), column] = values
+                # a file with fewer classes than --num_classes leaves no stale values behind
+                self.probe[len(values):, column] = np.nan
+            self.model.set_data(self.probe)
 
 
         info = f"({h}, {w}, {d}) {intensity}    cls: {cls}"
@@ -271,9 +743,11 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
         self.viewer.mainScrollBar.setRange(0, self.image.d - 1)
         self.viewer.mainScrollBar.setValue(self.index)
 
-        self.horizontalSlider_min.setRange(self.image.min, self.image.max)
+        # the intensity range may still be scanned in the background
+        v_min, v_max = self.image.value_range or (self.image.a_min, self.image.a_max)
+        self.horizontalSlider_min.setRange(int(v_min), int(v_max))
         self.horizontalSlider_min.setValue(self.image.a_min)
-        self.horizontalSlider_max.setRange(self.image.min, self.image.max)
+        self.horizontalSlider_max.setRange(int(v_min), int(v_max))
         self.horizontalSlider_max.setValue(self.image.a_max)
 
         self.viewer.mainScrollBar.setEnabled(True)
@@ -286,33 +760,66 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
             file_name, _ = QFileDialog.getOpenFileName(self, dir="./data", filter="nifty files(*.nii.gz)")
         if file_name == "":
             return
-        arr = get_array_from_file(file_name)
+        self.loader.submit(load_volume, file_name, self.volume_cache, label=f"Loading {os.path.basename(file_name)}",
+                           on_finished=partial(self.set_image, file_name))
+
+    def set_image(self, file_name, result):
+        arr, meta = result
         # arr = np.transpose(arr, (2, 1, 0))
-        self.image = ImageItem(arr, file_name)
+        self.image = ImageItem(arr, file_name, meta=meta, pyramid_cache_size=self.pyramid_cache_size)
         self.index = arr.shape[0] - 1
         self.set_image_property()
         self.visible = True
 
         if self.viewer.isHidden():
             self.viewer.show()
-        self.update_view()
+        self.state_changed()
+
+        # show the first slice right away, the intensity range follows
+        self.loader.submit(load_range, arr, label=f"Scanning {self.image.name}",
+                           on_finished=partial(self.set_image_range, self.image), quiet=True)
+
+    def set_image_range(self, image, value_range):
+        if image is not self.image:
+            return
+        image.set_value_range(value_range)
+        self.horizontalSlider_min.setRange(int(image.min), int(image.max))
+        self.horizontalSlider_max.setRange(int(image.min), int(image.max))
+        self.state_changed()
 
     def open_seg(self, file_name: str=None):
         if file_name == None or file_name == False or file_name == "":
             file_name, _ = QFileDialog.getOpenFileName(self, dir="./data", filter="nifty files(*.nii.gz)")
         if file_name == "":
             return
-        arr = get_array_from_file(file_name)
-        self.seg = SegmentationItem(arr, file_name)
+        self.loader.submit(load_segmentation, file_name, self.volume_cache, label=f"Loading {os.path.basename(file_name)}",
+                           on_finished=partial(self.set_seg, file_name))
+
+    def set_seg(self, file_name, result):
+        arr, meta, num_classes = result
+        self.seg = SegmentationItem(arr, file_name, num_classes, meta, self.pyramid_cache_size)
 
         self.horizontalSlider_seg.setEnabled(True)
         self.checkBox_seg.setEnabled(True)
         self.checkBox_seg.setChecked(True)
         self.horizontalSlider_seg.setValue(int(self.seg.opacity * 100))
 
-        self.update_view()
+        self.state_changed()
+        self.metrics_scheduler.request()
+
+        self.seg_occupancy = None
+        self.loader.submit(load_label_occupancy, arr, num_classes + 1, label=f"Indexing {self.seg.name}",
+                           on_finished=partial(self.set_occupancy, self.seg), quiet=True)
 
     def open_logits(self, file_name=None, pos="left"):
+        if file_name == None or file_name == False or file_name == "":
+            file_name, _ = QFileDialog.getOpenFileName(self, dir="./data", filter="npy files(*.npy)")
+        if file_name == "":
+            return
+        self.loader.submit(load_logits, file_name, self.current_cls, label=f"Loading {os.path.basename(file_name)}",
+                           on_finished=partial(self.set_logits, file_name, pos=pos))
+
+    def set_logits(self, file_name, result, pos="left"):
 
         def setup_left_logits(arr, file_name):
             if self.logits_left is None:
@@ -320,8 +827,9 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
                 self.horizontalSlider_logits_left_high.setEnabled(True)
                 self.spinBox_logits_left_low_value.setEnabled(True)
                 self.spinBox_logits_left_high_value.setEnabled(True)
-            self.logits_left = LogitsItem(arr, file_name)
+            self.logits_left = LogitsItem(arr, file_name, self.cache_size, range_dict, self.pyramid_cache_size)
             self.label_left_logits.setText(self.logits_left.second_name)
+            items.append(self.logits_left)
 
         def setup_right_logits(arr, file_name):
             if self.logits_right is None:
@@ -329,20 +837,16 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
                 self.horizontalSlider_logits_right_high.setEnabled(True)
                 self.spinBox_logits_right_low_value.setEnabled(True)
                 self.spinBox_logits_right_high_value.setEnabled(True)
-            self.logits_right = LogitsItem(arr, file_name)
+            self.logits_right = LogitsItem(arr, file_name, self.cache_size, range_dict, self.pyramid_cache_size)
             self.label_right_logits.setText(self.logits_right.second_name)
+            items.append(self.logits_right)
 
-        if file_name == None or file_name == False or file_name == "":
-            file_name, _ = QFileDialog.getOpenFileName(self, dir="./data", filter="npy files(*.npy)")
-        if file_name == "":
-            return
-        arr = np.load(file_name).astype(np.float32)
-        if arr.ndim == 5 and arr.shape[0] == 1:
-            arr = arr[0]
+        arr, range_dict, stats = result
+        items = []
         print(arr.shape, self.image.arr.shape)
-        if arr.shape[1:] != self.image.arr.shape:
+        arr, transposed = orient_logits(arr, self.image.arr.shape)
+        if transposed:
             print("shape not match")
-            arr = np.transpose(arr, (0, 3, 2, 1))
         # arr = arr[:, :, ::-1, ::-1]
         # arr = np.transpose(arr, (0, 3, 2, 1))
         if pos == "left" or self.logits_left is None:
@@ -361,10 +865,164 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
             self.checkBox_logits.setChecked(True)
             self.logits_init = True
 
+        self.occupancy_scheduler.request()
+        self.update_disagreement()
+        self.metrics_scheduler.request()
+
+        # per-slice statistics are saved next to the file, build them in the background otherwise
+        if stats is not None and stats.transposed == transposed:
+            self.set_logits_stats(items, stats)
+        else:
+            self.loader.submit(load_logits_stats, arr, file_name, transposed, label=f"Scanning {os.path.basename(file_name)}",
+                               on_finished=partial(self.set_logits_stats, items), quiet=True)
+
+    def set_occupancy(self, item, occupancy):
+        if item is self.seg:
+            self.seg_occupancy = occupancy
+        self.update_occupancy_strip()
+
+    def update_logits_occupancy(self):
+        # thresholded logits are indexed for the current class, again whenever the thresholds settle
+        for pos, item in (("left", self.logits_left), ("right", self.logits_right)):
+            key = None if item is None else (item, self.current_cls, item.threshold_low, item.threshold_high)
+            if key == self.occupancy_keys.get(pos):
+                continue
+            self.occupancy_keys[pos] = key
+            self.logits_occupancy[pos] = None
+            task = self.occupancy_tasks.pop(pos, None)
+            if task is not None:
+                task.cancelled = True
+            if key is not None:
+                self.occupancy_tasks[pos] = self.loader.submit(
+                    load_logits_occupancy, item.logits, {self.current_cls: (item.threshold_low, item.threshold_high)},
+                    label=f"Indexing {item.name}", on_finished=partial(self.set_logits_occupancy, pos, key), quiet=True)
+        self.update_occupancy_strip()
+
+    def set_logits_occupancy(self, pos, key, occupancy):
+        if self.occupancy_keys.get(pos) != key or occupancy is None:
+            return
+        self.occupancy_tasks.pop(pos, None)
+        self.logits_occupancy[pos] = occupancy
+        self.update_occupancy_strip()
+
+    def get_occupancy(self):
+        # the segmentation is the reference when there is one, otherwise
+        # the slices either pane's thresholded overlay shows the class in
+        if self.seg_occupancy is not None:
+            return self.seg_occupancy
+        indices = [index for pos, index in self.logits_occupancy.items()
+                   if index is not None and self.occupancy_keys[pos][1] == self.current_cls]
+        if not indices:
+            return None
+        return indices[0] if len(indices) == 1 else indices[0].union(indices[1])
+
+    def update_occupancy_strip(self):
+        occupancy = self.get_occupancy()
+        if occupancy is None or self.current_cls >= occupancy.num_classes:
+            self.occupancyStrip.set_occupancy(None)
+        else:
+            self.occupancyStrip.set_occupancy(occupancy.occupancy[self.current_cls])
+
+    def jump_to_cls(self, step):
+        occupancy = self.get_occupancy()
+        if occupancy is None:
+            return
+        index = occupancy.next_slice(self.current_cls, self.index, step)
+        if index is not None:
+            self.viewer.mainScrollBar.setValue(index)
+
+    def update_disagreement(self):
+        self.disagreement = None
+        self.disagreementWindow.set_disagreement(None, self.current_cls)
+        left, right = self.logits_left, self.logits_right
+        if left is None or right is None or left.file_path == right.file_path or left.logits.shape != right.logits.shape:
+            return
+        self.loader.submit(load_disagreement, left.logits, right.logits, label="Comparing left / right logits",
+                           on_finished=partial(self.set_disagreement, left, right), quiet=True)
+
+    def set_disagreement(self, left, right, disagreement):
+        if left is not self.logits_left or right is not self.logits_right:
+            return
+        self.disagreement = disagreement
+        self.disagreement_rank = -1
+        self.disagreementWindow.set_disagreement(disagreement, self.current_cls)
+        if self.disagreement_visible:
+            self.state_changed()
+
+    def jump_to_disagreement(self, step):
+        if self.disagreement is None:
+            return
+        order = self.disagreement.order
+        self.disagreement_rank = (self.disagreement_rank + step) % len(order)
+        self.viewer.mainScrollBar.setValue(int(order[self.disagreement_rank]))
+
+    def set_disagreement_visible(self, visible):
+        self.disagreement_visible = visible
+        self.state_changed()
+
+    def update_metrics(self):
+        # argmax confusions are computed once per segmentation / logits pair,
+        # thresholded ones follow the current class and thresholds
+        if self.metricsWindow.isHidden() or self.seg is None:
+            return
+        threshold = self.metricsWindow.threshold_mode()
+        items = {"left": self.logits_left, "right": self.logits_right}
+        self.metrics_results = {key: result for key, result in self.metrics_results.items()
+                                if key[0] is self.seg and key[1] in items.values()}
+        for pos, item in items.items():
+            if item is None or item.logits.shape[1:] != self.seg.arr.shape:
+                self.metrics[pos] = None
+                continue
+            if threshold:
+                key = (self.seg, item, self.current_cls, item.threshold_low, item.threshold_high)
+            else:
+                key = (self.seg, item)
+            if key == self.metrics_keys.get(pos):
+                continue
+            self.metrics_keys[pos] = key
+            task = self.metrics_tasks.pop(pos, None)
+            if task is not None:
+                task.cancelled = True
+            if key in self.metrics_results:
+                self.metrics[pos] = self.metrics_results[key]
+                continue
+            if threshold:
+                self.metrics_tasks[pos] = self.loader.submit(
+                    load_threshold_confusion, self.seg.arr, item.logits[self.current_cls], self.current_cls,
+                    item.threshold_low, item.threshold_high, label=f"Scoring {item.name}",
+                    on_finished=partial(self.set_metrics, pos, key), quiet=True)
+            else:
+                self.metrics_tasks[pos] = self.loader.submit(
+                    load_confusion, self.seg.arr, item.logits, self.seg.num_classes + 1, label=f"Scoring {item.name}",
+                    on_finished=partial(self.set_metrics, pos, key), quiet=True)
+        self.show_metrics()
+
+    def set_metrics(self, pos, key, confusion):
+        self.metrics_results[key] = confusion
+        if self.metrics_keys.get(pos) == key:
+            self.metrics_tasks.pop(pos, None)
+            self.metrics[pos] = confusion
+            self.show_metrics()
+
+    def show_metrics(self):
+        if self.metricsWindow.isHidden():
+            return
+        # spacing is in mm, volumes are shown in ml
+        voxel_ml = float(np.prod(self.seg.spacing)) / 1000 if self.seg is not None else 0
+        self.metricsWindow.set_metrics(self.metrics["left"], self.metrics["right"], self.current_cls, self.index,
+                                       voxel_ml)
+
+    def set_logits_stats(self, items, stats):
+        for item in items:
+            item.set_stats(stats)
+
     def depth_scrollbar_handler(self, index):
         self.index = index
-        self.update_property()
-        self.update_view()
+        self.hover_scheduler.request()
+        self.scheduler.request()
+        if self.metricsWindow.isVisible():
+            self.metricsWindow.diceCurve.set_index(index)
+        self.request_planes()
 
     def intensity_slider_handler(self, index):
         if self.sender() == self.horizontalSlider_min:
@@ -379,20 +1037,26 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
             self.image.a_max = index
 
         self.image.update_arr()
-        self.update_view()
+        self.state_changed()
 
     def seg_slider_handler(self, index):
         self.seg.opacity = index / 100
-        self.update_view()
+        self.state_changed()
 
     def set_logits_style(self, style):
-        self.logits_left.set_style(style)
-        self.logits_right.set_style(style)
-        self.update_view()
+        # the shown slice and the prefetch window ahead are recolored now, the rest lazily.
+        # Cropped slices are not cached, they are colorized when drawn
+        indices = []
+        if self.crop is None:
+            indices = [self.index + self.prefetcher.direction * step for step in range(self.prefetcher.depth + 1)]
+        self.logits_left.set_style(style, indices, self.level)
+        if self.logits_right is not self.logits_left:
+            self.logits_right.set_style(style, indices, self.level)
+        self.state_changed()
 
     def logits_slider_handler(self, index):
         self.logits_opacity = index / 100
-        self.update_view()
+        self.state_changed()
 
     def logits_slider_threshold_handler(self, value):
         if self.sender() == self.horizontalSlider_logits_left_low:
@@ -416,16 +1080,18 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
                 return
             self.logits_right.threshold_high = value
 
-        self.update_view()
+        self.state_changed()
+        self.metrics_scheduler.request()
+        self.occupancy_scheduler.request()
 
     def set_seg_visible(self, state):
         self.seg.visible = self.checkBox_seg.isChecked()
-        self.update_view()
+        self.state_changed()
 
     def set_logits_visible(self, state):
         self.logits_left.visible = self.checkBox_logits.isChecked()
         self.logits_right.visible = self.checkBox_logits.isChecked()
-        self.update_view()
+        self.state_changed()
     
     def last_cls(self):
         if self.current_cls > 0:
@@ -436,30 +1102,36 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
             self.comboBox_logits.setCurrentIndex(self.current_cls + 1)
 
     def set_logits_cls(self, cls):
-        self.current_cls = int(cls)
-        self.logits_left.set_cls(self.current_cls)
-        threshold_range = self.logits_left.get_range()
-        self.horizontalSlider_logits_left_low.setRange(*threshold_range)
-        self.horizontalSlider_logits_left_high.setRange(*threshold_range)
-        self.horizontalSlider_logits_left_low.setValue(threshold_range[0])
-        self.horizontalSlider_logits_left_high.setValue(threshold_range[1])
-        self.spinBox_logits_left_low_value.setRange(*threshold_range)
-        self.spinBox_logits_left_high_value.setRange(*threshold_range)
-        self.spinBox_logits_left_low_value.setValue(threshold_range[0])
-        self.spinBox_logits_left_high_value.setValue(threshold_range[1])
-
-        self.logits_right.set_cls(self.current_cls)
-        threshold_range = self.logits_right.get_range()
-        self.horizontalSlider_logits_right_low.setRange(*threshold_range)
-        self.horizontalSlider_logits_right_high.setRange(*threshold_range)
-        self.horizontalSlider_logits_right_low.setValue(threshold_range[0])
-        self.horizontalSlider_logits_right_high.setValue(threshold_range[1])
-        self.spinBox_logits_right_low_value.setRange(*threshold_range)
-        self.spinBox_logits_right_high_value.setRange(*threshold_range)
-        self.spinBox_logits_right_low_value.setValue(threshold_range[0])
-        self.spinBox_logits_right_high_value.setValue(threshold_range[1])
-
-        self.update_view()
+        # the setValue calls below each fire handlers, render once at the end
+        with self.scheduler.transaction():
+            self.current_cls = int(cls)
+            self.logits_left.set_cls(self.current_cls)
+            threshold_range = self.logits_left.get_range()
+            self.horizontalSlider_logits_left_low.setRange(*threshold_range)
+            self.horizontalSlider_logits_left_high.setRange(*threshold_range)
+            self.horizontalSlider_logits_left_low.setValue(threshold_range[0])
+            self.horizontalSlider_logits_left_high.setValue(threshold_range[1])
+            self.spinBox_logits_left_low_value.setRange(*threshold_range)
+            self.spinBox_logits_left_high_value.setRange(*threshold_range)
+            self.spinBox_logits_left_low_value.setValue(threshold_range[0])
+            self.spinBox_logits_left_high_value.setValue(threshold_range[1])
+
+            self.logits_right.set_cls(self.current_cls)
+            threshold_range = self.logits_right.get_range()
+            self.horizontalSlider_logits_right_low.setRange(*threshold_range)
+            self.horizontalSlider_logits_right_high.setRange(*threshold_range)
+            self.horizontalSlider_logits_right_low.setValue(threshold_range[0])
+            self.horizontalSlider_logits_right_high.setValue(threshold_range[1])
+            self.spinBox_logits_right_low_value.setRange(*threshold_range)
+            self.spinBox_logits_right_high_value.setRange(*threshold_range)
+            self.spinBox_logits_right_low_value.setValue(threshold_range[0])
+            self.spinBox_logits_right_high_value.setValue(threshold_range[1])
+
+            self.state_changed()
+            self.update_occupancy_strip()
+            self.disagreementWindow.set_disagreement(self.disagreement, self.current_cls)
+            self.metrics_scheduler.request()
+            self.occupancy_scheduler.request()
 
     def scene_MousePressEvent(self, event):
         if not self.visible:
@@ -483,13 +1155,15 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
             self.h = self.image.h - 1
         if self.w >= self.image.w:
             self.w = self.image.w - 1
-        self.update_property()
+        self.hover_scheduler.request()
+        self.request_planes()
 
         if event.buttons() == Qt.MiddleButton or event.buttons() == Qt.LeftButton:
             self.MouseMove = event.scenePos() - self.preMousePosition
             self.preMousePosition = event.scenePos()
             self.pixmapItem_left.setPos(self.pixmapItem_left.pos() + self.MouseMove)
             self.pixmapItem_right.setPos(self.pixmapItem_right.pos() + self.MouseMove)
+            self.update_crop()
 
     def scene_wheelEvent(self, event):
         if not self.visible:
@@ -502,8 +1176,8 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
                 if self.ratio > self.zoom_max:
                     self.ratio = self.zoom_max
                 else:
-                    w = self.pixmap_left.size().width() * (self.ratio - self.zoom_step)
-                    h = self.pixmap_left.size().height() * (self.ratio - self.zoom_step)
+                    w = self.image.w * (self.ratio - self.zoom_step)
+                    h = self.image.h * (self.ratio - self.zoom_step)
                     x1 = self.pixmapItem_left.pos().x()  # 图元左位置
                     x2 = self.pixmapItem_left.pos().x() + w  # 图元右位置
                     y1 = self.pixmapItem_left.pos().y()  # 图元上位置
@@ -527,8 +1201,8 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
                     else:
                         self.pixmapItem_left.setScale(self.ratio)  # 缩放
                         self.pixmapItem_right.setScale(self.ratio)  # 缩放
-                        delta_x = (self.pixmap_left.size().width() * self.zoom_step) / 2  # 图元偏移量
-                        delta_y = (self.pixmap_left.size().height() * self.zoom_step) / 2
+                        delta_x = (self.image.w * self.zoom_step) / 2  # 图元偏移量
+                        delta_y = (self.image.h * self.zoom_step) / 2
                         self.pixmapItem_left.setPos(self.pixmapItem_left.pos().x() - delta_x,
                                                     self.pixmapItem_left.pos().y() - delta_y)  # 图元偏移
                         self.pixmapItem_right.setPos(self.pixmapItem_right.pos().x() - delta_x,
@@ -538,8 +1212,8 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
                 if self.ratio < 0.2:
                     self.ratio = 0.2
                 else:
-                    w = self.pixmap_left.size().width() * (self.ratio + self.zoom_step)
-                    h = self.pixmap_left.size().height() * (self.ratio + self.zoom_step)
+                    w = self.image.w * (self.ratio + self.zoom_step)
+                    h = self.image.h * (self.ratio + self.zoom_step)
                     x1 = self.pixmapItem_left.pos().x()
                     x2 = self.pixmapItem_left.pos().x() + w
                     y1 = self.pixmapItem_left.pos().y()
@@ -562,10 +1236,11 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
                     else:
                         self.pixmapItem_left.setScale(self.ratio)
                         self.pixmapItem_right.setScale(self.ratio)
-                        delta_x = (self.pixmap_left.size().width() * self.zoom_step) / 2
-                        delta_y = (self.pixmap_left.size().height() * self.zoom_step) / 2
+                        delta_x = (self.image.w * self.zoom_step) / 2
+                        delta_y = (self.image.h * self.zoom_step) / 2
                         self.pixmapItem_left.setPos(self.pixmapItem_left.pos().x() + delta_x, self.pixmapItem_left.pos().y() + delta_y)
                         self.pixmapItem_right.setPos(self.pixmapItem_right.pos().x() + delta_x, self.pixmapItem_right.pos().y() + delta_y)
+            self.update_level()
         else:
             if event.delta() > 0:
                 index = self.index + 1
@@ -590,6 +1265,22 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
             self.last_cls()
         elif key == Qt.Key.Key_D:
             self.next_cls()
+        elif key == Qt.Key.Key_E:
+            self.jump_to_cls(1)
+        elif key == Qt.Key.Key_Q:
+            self.jump_to_cls(-1)
+        elif key == Qt.Key.Key_R:
+            self.jump_to_disagreement(1)
+        elif key == Qt.Key.Key_F:
+            self.jump_to_disagreement(-1)
+        elif key == Qt.Key.Key_X:
+            self.set_disagreement_visible(not self.disagreement_visible)
+        elif key == Qt.Key.Key_V:
+            self.set_planes_visible(not self.planes_visible)
+        elif key == Qt.Key.Key_F2:
+            self.set_hud_visible(self.hud.isHidden())
+        elif key == Qt.Key.Key_F3:
+            self.dump_trace()
 
 
     def dragEnterEvent(self, event: PySide6.QtGui.QDragEnterEvent) -> None:
@@ -604,19 +1295,48 @@ class MainWindow(QWidget, tool_bar.Ui_Form):
 
     def dropFileHandler(self, pairs: list[tuple]):
         func = {
-            "Volume": (self.open_file, 0),
-            "Segmentation": (self.open_seg, 1),
-            "Logits (left)": (partial(self.open_logits, pos="left"), 2),
-            "Logits (right)": (partial(self.open_logits, pos="right"), 3),
+            "Volume": (partial(load_volume, cache=self.volume_cache), self.set_image, 0),
+            "Segmentation": (partial(load_segmentation, cache=self.volume_cache), self.set_seg, 1),
+            "Logits (left)": (partial(load_logits, cls=self.current_cls), partial(self.set_logits, pos="left"), 2),
+            "Logits (right)": (partial(load_logits, cls=self.current_cls), partial(self.set_logits, pos="right"), 3),
         }
-        pairs.sort(key=lambda tup: func[tup[1]][1])
-        for file_name, type_ in pairs:
-            func[type_][0](file_name)
+        pairs.sort(key=lambda tup: func[tup[1]][2])
+
+        # the reads are independent and run concurrently, but later files depend on the
+        # earlier ones (e.g. logits on the volume shape), so results are applied in order
+        results = [None] * len(pairs)
+        finished = [False] * len(pairs)
+        applied = 0
+
+        def on_finished(i, result):
+            nonlocal applied
+            results[i], finished[i] = result, True
+            while applied < len(pairs) and finished[applied]:
+                file_name, type_ = pairs[applied]
+                if results[applied] is not None:
+                    func[type_][1](file_name, results[applied])
+                results[applied] = None
+                applied += 1
+
+        for i, (file_name, type_) in enumerate(pairs):
+            self.loader.submit(func[type_][0], file_name, label=f"Loading {os.path.basename(file_name)}",
+                               on_finished=partial(on_finished, i), on_failed=lambda message, i=i: on_finished(i, None))
 
     def showLogitsWindow(self, event):
         self.logitsWindow.show()
 
+    def showDisagreementWindow(self):
+        self.disagreementWindow.show()
+
+    def showMetricsWindow(self):
+        self.metricsWindow.show()
+        self.metrics_scheduler.request()
+        self.metrics_scheduler.flush()
+
     def exit_(self):
+        self.prefetcher.shutdown()
+        self.disagreementWindow.close()
+        self.metricsWindow.close()
         self.viewer.close()
         self.close()
 
@@ -1,19 +1,45 @@
 import argparse
 from typing import List
 
-from PySide6.QtWidgets import QApplication
-from mainWindow import MainWindow
+from utils.volume_cache import VolumeCache, DEFAULT_VOLUME_CACHE_DIR
+from utils.export import add_export_parser, export
 
 
 def get_opt():
     parser = argparse.ArgumentParser()
     parser.add_argument('-n', '--num_classes', type=int, default=19)
     parser.add_argument('-d', '--dummy_data_size', nargs='+', type=int, default=None)
+    parser.add_argument('-c', '--cache_size', type=int, default=512, help="colormap cache size in MB")
+    parser.add_argument('--prefetch_workers', type=int, default=2, help="0 disables slice prefetching")
+    parser.add_argument('--prefetch_depth', type=int, default=8, help="max slices composited ahead of scrolling")
+    parser.add_argument('--volume_cache_dir', type=str, default=DEFAULT_VOLUME_CACHE_DIR)
+    parser.add_argument('--volume_cache_size', type=float, default=0,
+                        help="decompressed volume cache size in GB, off (0) by default. Repeat opens of a NIfTI file "
+                             "skip decoding, at the cost of its uncompressed size on disk in --volume_cache_dir, "
+                             "often 5-10x the .nii.gz. 20 is a good size")
+    parser.add_argument('--plane_cache_size', type=int, default=1024, help="coronal / sagittal copy budget in MB, 0 disables them")
+    parser.add_argument('--pyramid_cache_size', type=int, default=128,
+                        help="downsampled slice cache for zoomed-out views in MB, per loaded volume / logits file")
+    # without a subcommand the viewer starts
+    subparsers = parser.add_subparsers(dest='command')
+    add_export_parser(subparsers)
     return parser.parse_args()
 
 if __name__ == "__main__":
     opt = get_opt()
-    app = QApplication([])
-    win = MainWindow(opt.num_classes, opt.dummy_data_size)
-    win.show()
-    app.exec()
+    volume_cache = None
+    if opt.volume_cache_size > 0:
+        volume_cache = VolumeCache(opt.volume_cache_dir, int(opt.volume_cache_size * 1024 ** 3))
+
+    if opt.command == 'export':
+        # headless, Qt is never imported
+        export(opt, volume_cache)
+    else:
+        from PySide6.QtWidgets import QApplication
+        from mainWindow import MainWindow
+        app = QApplication([])
+        win = MainWindow(opt.num_classes, opt.dummy_data_size, opt.cache_size * 1024 * 1024,
+                         opt.prefetch_workers, opt.prefetch_depth, volume_cache, opt.plane_cache_size * 1024 * 1024,
+                         opt.pyramid_cache_size * 1024 * 1024)
+        win.show()
+        app.exec()
@@ -0,0 +1,21 @@
+import os
+import time
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    # widgets are created offscreen, no display needed
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+def process_events(app, seconds=0.):
+    # runs the event loop for at least seconds, timers included
+    end = time.perf_counter() + seconds
+    app.processEvents()
+    while time.perf_counter() < end:
+        time.sleep(0.002)
+        app.processEvents()
@@ -0,0 +1,16 @@
+from benchmarks.bench import compare, MIN_TIME_DELTA
+
+
+def test_regressions_beyond_the_tolerance():
+    baseline = {"a": [0.1, 1e6], "b": [0.1, 1e8]}
+    results = {"a": [0.11, 1e6], "b": [0.2, 2e8]}
+    regressions, unmatched = compare(results, baseline, 0.25)
+    assert len(regressions) == 2 and all(line.startswith("b:") for line in regressions)
+    assert unmatched == []
+    # tiny stages are not flagged for noise
+    assert compare({"a": [MIN_TIME_DELTA / 2, 0]}, {"a": [MIN_TIME_DELTA / 10, 0]}, 0.25)[0] == []
+
+
+def test_unmatched_keys_are_reported():
+    regressions, unmatched = compare({"a": [1, 0], "renamed": [1, 0]}, {"a": [1, 0], "old": [1, 0]}, 0.25)
+    assert regressions == [] and unmatched == ["renamed"]
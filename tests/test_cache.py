@@ -0,0 +1,69 @@
+import numpy as np
+
+from utils.cache import SliceCache
+from utils.item import LogitsItem
+
+
+def block(value, nbytes=100):
+    return np.full(nbytes, value, dtype=np.uint8)
+
+
+def test_byte_cap_evicts_least_recently_used():
+    cache = SliceCache(max_bytes=300)
+    for key in "abc":
+        cache.put(key, block(ord(key)))
+    assert cache.nbytes == 300
+    # a read refreshes "a", so "b" is the oldest
+    assert cache.get("a")[0] == ord("a")
+    cache.put("d", block(ord("d")))
+    assert cache.keys() == ["c", "a", "d"]
+    assert "b" not in cache
+    assert cache.nbytes == 300
+
+
+def test_replacing_a_key_keeps_the_byte_count():
+    cache = SliceCache(max_bytes=1000)
+    cache.put("a", block(1, 100))
+    cache.put("a", block(2, 250))
+    assert len(cache) == 1
+    assert cache.nbytes == 250
+    assert cache.get("a")[0] == 2
+
+
+def test_oversized_values_are_returned_but_not_kept():
+    cache = SliceCache(max_bytes=100)
+    cache.put("a", block(1, 50))
+    value = cache.put("b", block(2, 200))
+    assert value.nbytes == 200
+    assert "b" not in cache
+    assert cache.keys() == ["a"]
+    assert cache.nbytes == 50
+
+
+def test_get_or_create_builds_once():
+    cache = SliceCache(max_bytes=1000)
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return block(7)
+
+    assert cache.get_or_create("k", factory)[0] == 7
+    assert cache.get_or_create("k", factory)[0] == 7
+    assert len(calls) == 1
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_logits_rgb_is_colorized_per_shown_slice():
+    # nothing is colorized up front, each shown slice once, within the cap
+    logits = np.random.default_rng(0).standard_normal((2, 6, 8, 8)).astype(np.float32)
+    slice_bytes = 8 * 8 * 3
+    item = LogitsItem(logits, "logits", cache_size=3 * slice_bytes)
+    assert len(item.rgb_cache) == 0
+    first = item.get_rgb(0)
+    assert item.get_rgb(0) is first
+    for index in range(1, 6):
+        item.get_rgb(index)
+    assert len(item.rgb_cache) == 3
+    assert item.rgb_cache.nbytes <= 3 * slice_bytes
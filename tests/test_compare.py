@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from utils.compare import Disagreement, disagreement_mask
+
+
+@pytest.fixture
+def logits():
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((4, 9, 20, 24)).astype(np.float32) * 3
+
+
+def test_disagreement_matches_brute_force(logits):
+    rng = np.random.default_rng(2)
+    other = logits + rng.standard_normal(logits.shape).astype(np.float32)
+    disagreement = Disagreement.build(logits, other)
+    differs = logits.argmax(axis=0) != other.argmax(axis=0)
+    assert np.allclose(disagreement.score, differs.mean(axis=(1, 2)))
+    assert np.allclose(disagreement.class_diff, np.abs(logits - other).mean(axis=(2, 3)), atol=1e-6)
+    assert np.array_equal(disagreement.ranked(), np.argsort(-disagreement.score, kind="stable"))
+    for d in range(logits.shape[1]):
+        assert np.array_equal(disagreement_mask(logits[:, d], other[:, d]), differs[d])
+
+
+def test_ranked_by_class(logits):
+    other = logits.copy()
+    other[2, 5] += 10
+    other[2, 1] += 3
+    disagreement = Disagreement.build(logits, other)
+    assert list(disagreement.ranked(2)[:2]) == [5, 1]
+    assert disagreement.score[5] > 0 and disagreement.score[0] == 0
+
+
+def test_memmapped_inputs(logits, tmp_path):
+    # read-only memmaps, as logits are opened in the viewer
+    np.save(tmp_path / "left.npy", logits)
+    np.save(tmp_path / "right.npy", logits[::-1].copy())
+    left = np.load(tmp_path / "left.npy", mmap_mode="r")
+    right = np.load(tmp_path / "right.npy", mmap_mode="r")
+    expected = Disagreement.build(logits, logits[::-1].copy())
+    assert np.array_equal(Disagreement.build(left, right).score, expected.score)
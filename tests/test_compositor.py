@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from utils.compositor import Compositor
+from utils.tools import label2rgb, logits2rgb
+
+
+TOLERANCE = 2  # 8.8 fixed point against the float blend, rounding only
+
+
+def float_compose(image, seg_rgb, seg_opacity, logits_left, logits_right, logits_opacity):
+    # the float path the compositor replaced
+    im_left = np.repeat(image[..., None], 3, axis=2).astype(np.float32) / 255
+    if seg_rgb is not None:
+        seg = np.float32(seg_rgb) / 255
+        im_left[seg > 0] = im_left[seg > 0] * seg_opacity
+        im_left = im_left + seg * (1 - seg_opacity)
+    im_right = im_left.copy()
+    if logits_left is not None:
+        logits, rgb, low, high = logits_left
+        mask = (logits >= low) & (logits <= high)
+        im_left[mask] = im_left[mask] * logits_opacity
+        im_left = im_left + np.float32(rgb) / 255 * (1 - logits_opacity) * mask[..., None]
+    if logits_right is not None:
+        logits, rgb, low, high = logits_right
+        mask = (logits >= low) & (logits <= high)
+        im_right = np.float32(rgb) / 255 * mask[..., None]
+    return np.uint8(255 * im_left), np.uint8(255 * im_right)
+
+
+def get_layers(seed, h=48, w=64):
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 256, (h, w), dtype=np.uint8)
+    seg_rgb = label2rgb(rng.integers(0, 4, (h, w)), num_classes=3)
+    logits = rng.standard_normal((h, w)).astype(np.float32) * 5
+    rgb = logits2rgb(logits, "JET", -15., 15.)
+    return image, seg_rgb, (logits, rgb, -1., 8.)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("seg_opacity, logits_opacity", [(0.1, 0.5), (0., 1.), (0.73, 0.21)])
+def test_compose_matches_float_blend(seed, seg_opacity, logits_opacity):
+    image, seg_rgb, layer = get_layers(seed)
+    left, right = Compositor().compose(image, seg_rgb, seg_opacity, layer, layer, logits_opacity)
+    expected_left, expected_right = float_compose(image, seg_rgb, seg_opacity, layer, layer, logits_opacity)
+    assert np.abs(left.astype(int) - expected_left).max() <= TOLERANCE
+    assert np.abs(right.astype(int) - expected_right).max() <= TOLERANCE
+
+
+def test_compose_hidden_layers():
+    image, _, _ = get_layers(0)
+    left, right = Compositor().compose(image)
+    assert np.array_equal(left, np.repeat(image[..., None], 3, axis=2))
+    assert np.array_equal(right, left)
+
+
+def test_compose_reuses_buffers_across_shapes():
+    compositor = Compositor()
+    for h, w in [(48, 64), (48, 64), (30, 20)]:
+        image, seg_rgb, layer = get_layers(1, h, w)
+        left, right = compositor.compose(image, seg_rgb, 0.3, layer, layer, 0.6)
+        expected_left, expected_right = float_compose(image, seg_rgb, 0.3, layer, layer, 0.6)
+        assert left.shape == (h, w, 3)
+        assert np.abs(left.astype(int) - expected_left).max() <= TOLERANCE
+        assert np.abs(right.astype(int) - expected_right).max() <= TOLERANCE
+
+
+def test_overlay_blends_both_panes():
+    image, _, layer = get_layers(2)
+    mask = np.zeros(image.shape, dtype=bool)
+    mask[10:20, 5:30] = True
+    color = np.array([255, 0, 255], dtype=np.uint8)
+    left, right = Compositor().compose(image, None, 0.1, layer, layer, 0.5, overlay=(mask, color, 0.25))
+    plain_left, plain_right = Compositor().compose(image, None, 0.1, layer, layer, 0.5)
+    for pane, plain in ((left, plain_left), (right, plain_right)):
+        assert np.array_equal(pane[~mask], plain[~mask])
+        expected = plain[mask] * 0.25 + color * 0.75
+        assert np.abs(pane[mask].astype(int) - expected).max() <= TOLERANCE
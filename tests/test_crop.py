@@ -0,0 +1,48 @@
+from utils.render import choose_crop
+from tests.conftest import process_events
+
+
+def test_crop_adds_a_margin_and_clamps():
+    rows, columns = choose_crop((100, 200, 300, 340), (1024, 1024))
+    assert rows == slice(74, 226) and columns == slice(289, 351)
+    rows, columns = choose_crop((0, 40, 1000, 1024), (1024, 1024))
+    assert rows.start == 0 and columns.stop == 1024
+
+
+def test_crop_is_kept_while_it_covers_the_view():
+    crop = choose_crop((100, 200, 100, 200), (1024, 1024))
+    # panning inside the margin, or zooming in a little, keeps it
+    assert choose_crop((110, 210, 90, 190), (1024, 1024), crop) is crop
+    assert choose_crop((110, 190, 110, 190), (1024, 1024), crop) is crop
+    # panning out of it, or zooming in far, crops again
+    assert choose_crop((150, 250, 100, 200), (1024, 1024), crop) != crop
+    assert choose_crop((140, 160, 140, 160), (1024, 1024), crop) != crop
+
+
+def test_whole_slice_when_cropping_saves_little():
+    assert choose_crop((0, 900, 0, 900), (1024, 1024)) is None
+    assert choose_crop((0, 1024, 0, 1024), (1024, 1024), (slice(0, 10), slice(0, 10))) is None
+    assert choose_crop((10, 10, 0, 100), (1024, 1024)) is None
+
+
+def test_viewer_resize_recomputes_the_crop(qapp):
+    from mainWindow import MainWindow
+    window = MainWindow(prefetch_workers=0, dummy_data_size=(4, 1024, 1024))
+    window.viewer.resize(400, 300)
+    window.viewer.show()
+    window.update_view()
+    window.ratio = 8
+    window.update_level()
+    window.update_crop()
+    process_events(qapp)
+    small = window.crop
+    assert small is not None
+    window.viewer.resize(1200, 900)
+    process_events(qapp)
+    assert window.crop != small
+    # the new crop covers the larger view and is stable
+    rows, columns = window.crop
+    rect = window.get_visible_rect()
+    assert rows.stop >= rect.bottom() and columns.stop >= rect.right()
+    assert window.get_crop() is window.crop
+    window.viewer.close()
@@ -0,0 +1,66 @@
+import argparse
+
+import numpy as np
+
+from utils.export import add_export_parser, export
+from utils.item import ImageItem, SegmentationItem, LogitsItem
+from utils.compositor import Compositor
+from utils.render import render_slice
+
+
+def write_case(tmp_path):
+    import SimpleITK as sitk
+    rng = np.random.default_rng(0)
+    image = rng.integers(-1000, 1000, (6, 24, 20)).astype(np.int16)
+    seg = rng.integers(0, 3, image.shape).astype(np.uint8)
+    logits = rng.standard_normal((3,) + image.shape).astype(np.float32)
+    sitk.WriteImage(sitk.GetImageFromArray(image), str(tmp_path / "img.nii.gz"))
+    sitk.WriteImage(sitk.GetImageFromArray(seg), str(tmp_path / "seg.nii.gz"))
+    np.save(tmp_path / "logits.npy", logits)
+    return image, seg, logits
+
+
+def parse(*args):
+    parser = argparse.ArgumentParser()
+    add_export_parser(parser.add_subparsers(dest='command'))
+    return parser.parse_args(['export'] + [str(arg) for arg in args])
+
+
+def expected_frames(opt, image, seg, logits, indices):
+    image_item = ImageItem(image, "img", (int(image.min()), int(image.max())))
+    image_item.a_min, image_item.a_max = opt.a_min, opt.a_max
+    image_item.update_arr()
+    seg_item = SegmentationItem(seg, "seg", int(seg.max()))
+    seg_item.opacity = opt.seg_opacity
+    a_min, a_max = float(logits[opt.cls].min()), float(logits[opt.cls].max())
+    logits_item = LogitsItem(logits, "logits", range_dict={opt.cls: (a_min, a_max)})
+    logits_item.set_cls(opt.cls)
+    logits_item.threshold_low, logits_item.threshold_high = a_min, a_max
+    compositor = Compositor()
+    for index in indices:
+        left, right = render_slice(index, compositor, image_item, seg_item, logits_item, logits_item,
+                                   opt.logits_opacity)
+        yield index, np.concatenate([left, right], axis=1)
+
+
+def test_png_export_matches_the_viewer(tmp_path):
+    import cv2
+    image, seg, logits = write_case(tmp_path)
+    out = tmp_path / "out"
+    opt = parse(tmp_path / "img.nii.gz", "-o", out, "--seg", tmp_path / "seg.nii.gz",
+                "--logits_left", tmp_path / "logits.npy", "--start", 1, "--step", 2, "--workers", 1)
+    export(opt)
+    assert sorted(path.name for path in out.iterdir()) == ["0001.png", "0003.png", "0005.png"]
+    for index, frame in expected_frames(opt, image, seg, logits, [1, 3, 5]):
+        png = cv2.cvtColor(cv2.imread(str(out / f"{index:04d}.png")), cv2.COLOR_BGR2RGB)
+        assert np.array_equal(png, frame)
+
+
+def test_single_pane_export(tmp_path):
+    import cv2
+    image, _, _ = write_case(tmp_path)
+    out = tmp_path / "out"
+    opt = parse(tmp_path / "img.nii.gz", "-o", out, "--pane", "left", "--stop", 2, "--workers", 2)
+    export(opt)
+    assert sorted(path.name for path in out.iterdir()) == ["0000.png", "0001.png"]
+    assert cv2.imread(str(out / "0001.png")).shape == (24, 20, 3)
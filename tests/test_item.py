@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from utils.item import ImageItem, SegmentationItem, LogitsItem
+from utils.tools import scale_to_uint8, downsample, logits2rgb
+
+
+@pytest.mark.parametrize("dtype", [np.int8, np.uint8, np.int16, np.int32, np.uint32, np.float64])
+@pytest.mark.parametrize("level", [1, 2])
+def test_image_pyramid_levels(dtype, level):
+    rng = np.random.default_rng(0)
+    info = np.iinfo(dtype) if np.issubdtype(dtype, np.integer) else None
+    low, high = (max(int(info.min), -1000), min(int(info.max), 1000)) if info is not None else (-1000, 1000)
+    arr = rng.integers(low, high, (3, 40, 52)).astype(dtype)
+    item = ImageItem(arr, "image", (low, high))
+    item.a_min, item.a_max = low // 2, high // 2
+    item.update_arr()
+    im = item.get_slice(1, level=level)
+    assert im.dtype == np.uint8
+    assert im.shape == (-(-40 // (1 << level)), -(-52 // (1 << level)))
+    # windowing the averaged raw values, as at level 0
+    expected = scale_to_uint8(downsample(arr[1], level), item.a_min, item.a_max)
+    assert np.array_equal(im, expected)
+    assert np.array_equal(item.get_slice(1), scale_to_uint8(arr[1], item.a_min, item.a_max))
+
+
+def test_segmentation_and_logits_levels():
+    rng = np.random.default_rng(1)
+    labels = rng.integers(0, 4, (2, 16, 16)).astype(np.uint8)
+    seg = SegmentationItem(labels, "seg", 3)
+    assert seg.get_rgb(0, level=1).shape == (8, 8, 3)
+    assert np.array_equal(seg.get_rgb(0, level=1), seg.get_rgb(0)[::2, ::2])
+
+    logits = LogitsItem(rng.standard_normal((3, 2, 16, 16)).astype(np.float32), "logits")
+    assert logits.get_slice(1, cls=2, level=1).shape == (8, 8)
+    assert logits.get_rgb(1, cls=2, level=1).shape == (8, 8, 3)
+
+
+def test_set_style_recolors_only_the_given_slices():
+    logits = np.random.default_rng(1).standard_normal((2, 40, 16, 16)).astype(np.float32)
+    item = LogitsItem(logits, "logits")
+    for index in range(40):
+        item.get_rgb(index)
+    item.set_style("HOT", [5, 6, 7])
+    hot = [key for key in item.rgb_cache.keys() if key[2] == "HOT"]
+    assert sorted(key[1] for key in hot) == [5, 6, 7]
+    a_min, a_max = item.get_cls_range(0)
+    for index in (6, 30):
+        assert np.array_equal(item.get_rgb(index), logits2rgb(logits[0, index], "HOT", a_min, a_max))
+    # out-of-range slices of the prefetch window are skipped
+    item.set_style("BONE", [38, 39, 40, 41])
+    assert sorted(key[1] for key in item.rgb_cache.keys() if key[2] == "BONE") == [38, 39]
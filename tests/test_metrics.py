@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from utils.metrics import Confusion
+
+
+NUM_CLASSES = 4
+
+
+@pytest.fixture
+def logits():
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((NUM_CLASSES, 9, 20, 24)).astype(np.float32) * 3
+
+
+@pytest.fixture
+def labels():
+    rng = np.random.default_rng(1)
+    arr = np.zeros((9, 20, 24), dtype=np.uint8)
+    arr[2:5, 3:9, 4:12] = 1
+    arr[6, 10:15, 1:3] = 2
+    # class 3 is absent, noise of classes 0 and 1 elsewhere
+    arr[8] = rng.integers(0, 2, (20, 24))
+    return arr
+
+
+def brute_dice(truth, predict, cls):
+    t, p = truth == cls, predict == cls
+    total = t.sum() + p.sum()
+    return 2 * (t & p).sum() / total if total else np.nan
+
+
+def test_dice_from_argmax(labels, logits):
+    confusion = Confusion.from_argmax(labels, logits, NUM_CLASSES)
+    predict = logits.argmax(axis=0)
+    assert confusion.counts.sum() == labels.size
+    dice, per_slice = confusion.dice(), confusion.dice(per_slice=True)
+    for cls in range(NUM_CLASSES):
+        assert np.allclose(dice[cls], brute_dice(labels, predict, cls), equal_nan=True)
+        for d in range(labels.shape[0]):
+            assert np.allclose(per_slice[cls, d], brute_dice(labels[d], predict[d], cls), equal_nan=True)
+
+
+def test_iou_from_threshold(labels, logits):
+    confusion = Confusion.from_threshold(labels, logits[1], 1, 0., 4.)
+    t, p = labels == 1, (logits[1] >= 0.) & (logits[1] <= 4.)
+    assert np.isclose(confusion.iou()[1], (t & p).sum() / (t | p).sum())
+    assert np.isclose(confusion.dice()[1], brute_dice(t.astype(int), p.astype(int), 1))
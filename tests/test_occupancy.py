@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from utils.occupancy import OccupancyIndex
+
+
+NUM_CLASSES = 4
+
+
+@pytest.fixture
+def logits():
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((NUM_CLASSES, 9, 20, 24)).astype(np.float32) * 3
+
+
+@pytest.fixture
+def labels():
+    rng = np.random.default_rng(1)
+    arr = np.zeros((9, 20, 24), dtype=np.uint8)
+    arr[2:5, 3:9, 4:12] = 1
+    arr[6, 10:15, 1:3] = 2
+    # class 3 is absent, noise of classes 0 and 1 elsewhere
+    arr[8] = rng.integers(0, 2, (20, 24))
+    return arr
+
+
+def brute_bbox(mask):
+    if not mask.any():
+        return None
+    return tuple((int(idx.min()), int(idx.max())) for idx in np.nonzero(mask))
+
+
+def test_occupancy_from_labels(labels):
+    index = OccupancyIndex.from_labels(labels, NUM_CLASSES)
+    for cls in range(NUM_CLASSES):
+        mask = labels == cls
+        assert np.array_equal(index.slices(cls), np.flatnonzero(mask.any(axis=(1, 2))))
+        assert index.bbox(cls) == brute_bbox(mask)
+    assert index.next_slice(1, 0) == 2
+    assert index.next_slice(1, 4) == 8
+    assert index.next_slice(2, 6) is None
+    assert index.next_slice(2, 8, step=-1) == 6
+    assert index.next_slice(3, 0) is None
+
+
+def test_occupancy_thresholded(logits):
+    thresholds = {1: (2., 6.), 3: (-1., 0.5)}
+    index = OccupancyIndex.from_logits(logits, thresholds)
+    for cls in range(NUM_CLASSES):
+        if cls in thresholds:
+            low, high = thresholds[cls]
+            mask = (logits[cls] >= low) & (logits[cls] <= high)
+        else:
+            mask = np.zeros(logits.shape[1:], dtype=bool)
+        assert index.bbox(cls) == brute_bbox(mask)
+        assert np.array_equal(index.occupancy[cls], mask.any(axis=(1, 2)))
+
+
+def test_occupancy_union(logits):
+    left = OccupancyIndex.from_logits(logits[:, :5], {2: (8., 9.)})
+    right = OccupancyIndex.from_logits(logits[:, :5], {2: (-9., -8.)})
+    mask = ((logits[2, :5] >= 8.) & (logits[2, :5] <= 9.)) | ((logits[2, :5] >= -9.) & (logits[2, :5] <= -8.))
+    assert left.union(right).bbox(2) == brute_bbox(mask)
+
+
+def test_labels_across_slabs(labels, monkeypatch):
+    # labels beyond num_classes are clipped to the last class, as before
+    labels = labels.copy()
+    labels[0, 0, 0] = 200
+    expected = OccupancyIndex.from_labels(labels, NUM_CLASSES)
+    monkeypatch.setattr("utils.occupancy.CHUNK_BYTES", 2 * 20 * 24)
+    index = OccupancyIndex.from_labels(labels, NUM_CLASSES)
+    assert np.array_equal(index.occupancy, expected.occupancy)
+    assert np.array_equal(index.rows, expected.rows) and np.array_equal(index.cols, expected.cols)
+    assert index.bbox(3) == ((0, 0), (0, 0), (0, 0))
@@ -0,0 +1,48 @@
+import gc
+
+import numpy as np
+
+from utils.planes import PlaneSource, PlaneCache, AXIAL, CORONAL, SAGITTAL
+
+
+def test_copies_match_strided_slices(tmp_path):
+    arr = np.random.default_rng(0).integers(0, 1000, (7, 9, 11)).astype(np.int16)
+    np.save(tmp_path / "arr.npy", arr)
+    source = PlaneSource(np.load(tmp_path / "arr.npy", mmap_mode="r"))
+    assert source.missing() == [SAGITTAL, CORONAL]
+    expected = {axis: [np.array(source.get(axis, i)) for i in range(arr.shape[axis])] for axis in (CORONAL, SAGITTAL)}
+    source.copies.update(source.build(source.missing()))
+    assert source.missing() == []
+    for axis, slices in expected.items():
+        for i, im in enumerate(slices):
+            assert np.array_equal(source.get(axis, i), im)
+    assert np.array_equal(source.get(AXIAL, 3), arr[3])
+
+
+def test_budget_and_dropped_sources():
+    arr = np.zeros((4, 8, 8), dtype=np.float32)
+    a, b = PlaneSource(np.asfortranarray(arr)), PlaneSource(np.asfortranarray(arr))
+    cache = PlaneCache(3 * arr.nbytes)
+    plans = cache.plan([a, b])
+    # a gets both copies, b only what is left
+    assert plans == [(a, [SAGITTAL, CORONAL]), (b, [SAGITTAL])]
+    assert cache.plan([a, b]) == []
+    for source, axes in plans:
+        cache.put(source, source.build(axes))
+    assert cache.nbytes == 3 * arr.nbytes
+    cache.plan([b])
+    assert a.copies == {} and cache.nbytes == arr.nbytes
+
+
+def test_new_sources_never_match_old_entries():
+    arr = np.zeros((4, 8, 8), dtype=np.float32)
+    cache = PlaneCache(4 * arr.nbytes)
+    old = PlaneSource(np.asfortranarray(arr))
+    [(_, axes)] = cache.plan([old])
+    token = old.token
+    del old
+    gc.collect()
+    # a reloaded volume is planned afresh, even if its object reuses the old id
+    new = PlaneSource(np.asfortranarray(arr))
+    assert new.token != token
+    assert cache.plan([new]) == [(new, [SAGITTAL, CORONAL])]
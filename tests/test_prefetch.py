@@ -0,0 +1,64 @@
+import threading
+import time
+
+import numpy as np
+
+from utils.prefetch import SlicePrefetcher
+
+
+def wait_done(prefetcher, timeout=5):
+    start = time.perf_counter()
+    while any(not future.done() for _, future in prefetcher._jobs.values()):
+        assert time.perf_counter() - start < timeout
+        time.sleep(0.005)
+
+
+def test_workers_render_the_snapshot():
+    state = {"value": 1}
+    snapshots = []
+
+    def snapshot():
+        snapshots.append(dict(state))
+        return snapshots[-1]
+
+    def render(index, compositor, params):
+        frame = np.full((2, 2, 3), index * 10 + params["value"], dtype=np.uint8)
+        return frame, frame
+
+    prefetcher = SlicePrefetcher(render, snapshot, workers=2, depth=4)
+    try:
+        prefetcher.update(0, 10)
+        # the live state changes after the jobs were queued
+        state["value"] = 2
+        wait_done(prefetcher)
+        assert prefetcher.take(1)[0][0, 0, 0] == 11
+        assert len(snapshots) == 1
+
+        prefetcher.invalidate()
+        prefetcher.update(1, 10)
+        wait_done(prefetcher)
+        assert prefetcher.take(2)[0][0, 0, 0] == 22
+        assert len(snapshots) == 2
+    finally:
+        prefetcher.shutdown()
+
+
+def test_take_does_not_wait_for_a_running_job():
+    release = threading.Event()
+
+    def render(index, compositor, params):
+        release.wait(5)
+        frame = np.zeros((2, 2, 3), dtype=np.uint8)
+        return frame, frame
+
+    prefetcher = SlicePrefetcher(render, lambda: None, workers=1, depth=2)
+    try:
+        prefetcher.update(0, 10)
+        time.sleep(0.05)
+        start = time.perf_counter()
+        assert prefetcher.take(1) is None
+        assert time.perf_counter() - start < 0.5
+        assert prefetcher.misses == 1
+    finally:
+        release.set()
+        prefetcher.shutdown()
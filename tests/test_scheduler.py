@@ -0,0 +1,74 @@
+from utils.scheduler import RenderScheduler
+from tests.conftest import process_events
+
+
+def test_requests_coalesce_into_one_render(qapp):
+    renders = []
+    scheduler = RenderScheduler(lambda: renders.append(1))
+    for _ in range(10):
+        scheduler.request()
+    assert renders == []
+    process_events(qapp, 0.02)
+    assert len(renders) == 1
+    assert scheduler.rendered == 1 and scheduler.skipped == 9
+    # nothing pending, nothing rendered
+    process_events(qapp, 0.02)
+    assert len(renders) == 1
+
+
+def test_transaction_renders_once_after_the_block(qapp):
+    renders = []
+    scheduler = RenderScheduler(lambda: renders.append(1))
+    with scheduler.transaction():
+        scheduler.request()
+        with scheduler.transaction():
+            scheduler.request()
+        process_events(qapp, 0.02)
+        # still inside the outer block
+        assert renders == []
+    process_events(qapp, 0.02)
+    assert len(renders) == 1
+
+
+def test_flush_renders_now(qapp):
+    renders = []
+    scheduler = RenderScheduler(lambda: renders.append(1), interval=1000)
+    scheduler.flush()
+    assert renders == []
+    scheduler.request()
+    scheduler.flush()
+    assert len(renders) == 1
+    process_events(qapp, 0.02)
+    assert len(renders) == 1
+
+
+def test_interval_throttles(qapp):
+    renders = []
+    scheduler = RenderScheduler(lambda: renders.append(1), interval=50)
+    scheduler.request()
+    process_events(qapp, 0.02)
+    assert renders == []
+    process_events(qapp, 0.1)
+    assert len(renders) == 1
+
+
+def test_debounce_waits_for_the_burst_to_end(qapp):
+    renders = []
+    scheduler = RenderScheduler(lambda: renders.append(1), interval=60, debounce=True)
+    # a drag: a request every 20 ms for 200 ms, longer than the interval
+    for _ in range(10):
+        scheduler.request()
+        process_events(qapp, 0.02)
+    assert renders == []
+    process_events(qapp, 0.15)
+    assert len(renders) == 1
+
+
+def test_throttle_renders_during_the_burst(qapp):
+    renders = []
+    scheduler = RenderScheduler(lambda: renders.append(1), interval=60)
+    for _ in range(10):
+        scheduler.request()
+        process_events(qapp, 0.02)
+    process_events(qapp, 0.15)
+    assert len(renders) >= 2
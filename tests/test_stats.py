@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from utils.stats import LogitsStats, CHUNK_BYTES
+
+
+NUM_CLASSES = 4
+
+
+@pytest.fixture
+def logits():
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((NUM_CLASSES, 9, 20, 24)).astype(np.float32) * 3
+
+
+@pytest.mark.parametrize("shape, slab", [((19, 600, 512, 512), 3), ((2, 100, 128, 128), 512), ((1, 5, 8192, 8192), 1)])
+def test_slab_size(shape, slab):
+    assert LogitsStats.get_slab(shape) == slab
+    # a slab of every class fits the chunk
+    assert slab == 1 or 4 * int(np.prod(shape[:1] + shape[2:])) * slab <= CHUNK_BYTES
+
+
+def test_stats_match_brute_force(logits):
+    stats = LogitsStats.build(logits, num_bins=16)
+    flat = logits.reshape(NUM_CLASSES, logits.shape[1], -1)
+    assert np.allclose(stats.slice_min, flat.min(axis=2))
+    assert np.allclose(stats.slice_max, flat.max(axis=2))
+    assert np.allclose(stats.slice_mean, flat.mean(axis=2), atol=1e-5)
+    for cls in range(NUM_CLASSES):
+        assert stats.get_range(cls) == (float(logits[cls].min()), float(logits[cls].max()))
+        hist, edges = stats.get_class_hist(cls)
+        assert hist.sum() == logits[cls].size
+        expected, _ = np.histogram(logits[cls], bins=edges.astype(np.float64))
+        # values on a bin edge may land on either side in float32
+        assert np.abs(hist - expected).sum() <= 2 * len(edges)
+
+
+def test_stats_round_trip(logits, tmp_path):
+    file_name = str(tmp_path / "logits.npy")
+    np.save(file_name, logits)
+    stats = LogitsStats.build(logits)
+    stats.save(file_name)
+    loaded = LogitsStats.load(file_name)
+    assert np.array_equal(loaded.hist, stats.hist)
+    assert loaded.get_range_dict() == stats.get_range_dict()
+
+
+def test_stats_across_slabs(monkeypatch):
+    # several slabs per volume, results must not depend on the split
+    monkeypatch.setattr("utils.stats.CHUNK_BYTES", 4 * 3 * 6 * 5 * 2)
+    arr = np.random.default_rng(3).standard_normal((3, 11, 6, 5)).astype(np.float32)
+    assert LogitsStats.get_slab(arr.shape) == 2
+    stats = LogitsStats.build(arr, num_bins=8)
+    assert np.allclose(stats.slice_max, arr.reshape(3, 11, -1).max(axis=2))
+    assert stats.hist.sum(axis=2).tolist() == [[30] * 11] * 3
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from PySide6.QtCore import Qt
+
+
+@pytest.fixture
+def model(qapp):
+    from mainWindow import TableModel
+    model = TableModel(5)
+    changes = []
+    model.dataChanged.connect(lambda top, bottom, roles: changes.append((top.row(), bottom.row(), top.column())))
+    model.changes = changes
+    return model
+
+
+def test_only_changed_cells_are_repainted(model):
+    data = np.arange(10, dtype=np.float32).reshape(5, 2)
+    model.set_data(data)
+    # the table starts at zero, cell (0, 0) keeps its value
+    assert sorted(model.changes) == [(0, 4, 1), (1, 4, 0)]
+    model.changes.clear()
+    model.set_data(data)
+    assert model.changes == []
+    data[2, 1] = 100
+    model.set_data(data)
+    # the new value, and the old max losing its highlight
+    assert model.changes == [(2, 4, 1)]
+
+
+def test_column_max_is_highlighted(model):
+    model.set_data(np.array([[1, 5], [3, 2], [2, -1], [0, 0], [-4, 4]], dtype=np.float32))
+    assert np.array_equal(np.flatnonzero(model._highlight[:, 0]), [1])
+    assert np.array_equal(np.flatnonzero(model._highlight[:, 1]), [0])
+    assert model.data(model.index(1, 0), Qt.DisplayRole) == "3.000"
+
+
+def test_nan_rows_are_blank(model):
+    data = np.full((5, 2), np.nan, dtype=np.float32)
+    data[:3] = [[1, 2], [3, 1], [2, 0]]
+    model.set_data(data)
+    assert model.data(model.index(4, 0), Qt.DisplayRole) == ""
+    assert not model._highlight[3:].any()
+    model.changes.clear()
+    # nan stays nan, no repaint
+    model.set_data(data)
+    assert model.changes == []
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from utils.tools import PALETTE, NONE_PALETTE, label2rgb, logits2rgb, get_heatmap, normalize, scale_to_uint8, \
+    window_lut, array_range, softmax, downsample, SLAB_SIZE
+
+
+def test_label2rgb_matches_loop():
+    rng = np.random.default_rng(0)
+    arr = rng.integers(0, 6, (3, 20, 30)).astype(np.uint8)
+    expected = np.zeros(arr.shape + (3,), dtype=np.uint8)
+    for cls in range(6):
+        expected[arr == cls] = PALETTE[cls]
+    assert np.array_equal(label2rgb(arr, 5), expected)
+
+
+def test_label2rgb_beyond_palette():
+    arr = np.arange(len(PALETTE) + 10).reshape(1, -1)
+    rgb = label2rgb(arr)
+    assert rgb.shape == arr.shape + (3,)
+    assert np.array_equal(rgb[0, :len(PALETTE)], PALETTE)
+
+
+def test_logits2rgb_matches_heatmap():
+    # one LUT lookup against the per-slice normalize + colormap path
+    rng = np.random.default_rng(1)
+    arr = rng.standard_normal((4, 16, 24)).astype(np.float32)
+    expected = np.array([get_heatmap(im) for im in normalize(arr, arr.min(), arr.max())])
+    assert np.abs(logits2rgb(arr).astype(int) - expected).max() <= 4
+
+
+def test_logits2rgb_slabs_match_slices():
+    rng = np.random.default_rng(2)
+    arr = rng.standard_normal((3 * SLAB_SIZE + 1, 8, 8)).astype(np.float32)
+    a_min, a_max = float(arr.min()), float(arr.max())
+    volume = logits2rgb(arr)
+    for index in range(arr.shape[0]):
+        assert np.array_equal(volume[index], logits2rgb(arr[index], "JET", a_min, a_max))
+
+
+def test_logits2rgb_none_palette():
+    arr = np.array([[0, 1, -1, 300]], dtype=np.float32)
+    rgb = logits2rgb(arr, "NONE")
+    assert np.array_equal(rgb[0], NONE_PALETTE[np.array([0, 1, -1, 300]) % len(NONE_PALETTE)])
+
+
+@pytest.mark.parametrize("a_min, a_max", [(-1200, 400), (0, 1), (5, 5)])
+def test_window_lut_matches_scale(a_min, a_max):
+    values = np.arange(-2000, 2000, dtype=np.int16)
+    lut = window_lut(values.min(), values.max(), a_min, a_max)
+    assert np.array_equal(lut[values - values.min()], scale_to_uint8(values, a_min, a_max))
+
+
+def test_normalize():
+    arr = np.array([-2000, -1200, -400, 400, 1000], dtype=np.int16)
+    assert np.allclose(normalize(arr, -1200, 400), [0, 0, 0.5, 1, 1])
+
+
+def test_array_range_slabs():
+    rng = np.random.default_rng(3)
+    arr = rng.standard_normal((5 * SLAB_SIZE + 3, 4, 4)).astype(np.float32)
+    assert array_range(arr) == (arr.min(), arr.max())
+
+
+def test_softmax():
+    rng = np.random.default_rng(4)
+    arr = rng.standard_normal((3, 5, 6)).astype(np.float32) * 50
+    res = softmax(arr, 0)
+    exp = np.exp(arr.astype(np.float64) - arr.max(axis=0))
+    assert np.allclose(res, exp / exp.sum(axis=0), atol=1e-6)
+    assert np.allclose(res.sum(axis=0), 1, atol=1e-5)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.int8, np.int16, np.uint16, np.int32, np.uint32, np.int64])
+def test_downsample_keeps_integer_dtype(dtype):
+    info = np.iinfo(dtype)
+    rng = np.random.default_rng(5)
+    arr = rng.integers(max(info.min, -5000), min(info.max, 5000), (32, 50), endpoint=True).astype(dtype)
+    res = downsample(arr, 1)
+    assert res.dtype == dtype
+    expected = arr.astype(np.float64).reshape(16, 2, 25, 2).mean(axis=(1, 3))
+    assert np.abs(res.astype(np.float64) - expected).max() <= 1
+    # odd sizes round up
+    assert downsample(arr[:31, :49], 2).shape == (8, 13)
+
+
+def test_downsample_float():
+    arr = np.arange(16, dtype=np.float64).reshape(4, 4)
+    assert np.allclose(downsample(arr, 1), [[2.5, 4.5], [10.5, 12.5]])
@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+
+from utils.volume_cache import VolumeCache
+
+
+def test_put_later_round_trip(tmp_path):
+    source = tmp_path / "volume.nii.gz"
+    source.write_bytes(b"not decoded here")
+    cache = VolumeCache(str(tmp_path / "cache"), 1024 ** 2)
+    arr = np.arange(24, dtype=np.int16).reshape(2, 3, 4)
+    assert cache.get(str(source)) is None
+    cache.put_later(str(source), arr, {"spacing": [1., 1., 2.]}).result()
+    cached, meta = cache.get(str(source))
+    assert isinstance(cached, np.memmap)
+    assert np.array_equal(cached, arr)
+    assert meta == {"spacing": [1., 1., 2.]}
+
+
+def test_evicts_least_recently_used(tmp_path):
+    arr = np.zeros((64, 64), dtype=np.float32)  # 16 KB
+    cache = VolumeCache(str(tmp_path / "cache"), int(2.5 * arr.nbytes))
+    sources = []
+    for i in range(3):
+        source = tmp_path / f"volume{i}.nii.gz"
+        source.write_bytes(bytes([i]))
+        sources.append(str(source))
+        cache.put(sources[-1], arr, {})
+        # distinct last-used times
+        os.utime(cache.paths(cache.key(sources[-1]))[0], (i, i))
+        cache.evict()
+    assert cache.get(sources[0]) is None
+    assert cache.get(sources[1]) is not None
+    assert cache.get(sources[2]) is not None
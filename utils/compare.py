@@ -0,0 +1,49 @@
+import numpy as np
+
+from utils.tools import get_pool
+
+
+CHUNK_BYTES = 64 * 1024 * 1024
+DISAGREEMENT_COLOR = np.array([255, 0, 255], dtype=np.uint8)
+
+
+class Disagreement:
+    # per-slice comparison of two (C, D, H, W) logits volumes
+
+    def __init__(self, score, class_diff):
+        self.score: np.ndarray = score            # (D,) fraction of voxels whose argmax differs
+        self.class_diff: np.ndarray = class_diff  # (C, D) mean |left - right| per class
+        self.order: np.ndarray = np.argsort(-score, kind="stable")
+
+    def ranked(self, cls=None):
+        # slice indices, most disagreeing first, by argmax or by one class's logit difference
+        if cls is None:
+            return self.order
+        return np.argsort(-self.class_diff[cls], kind="stable")
+
+    @classmethod
+    def build(cls, left, right, check=None):
+        # streams depth slabs of both volumes, so memory-mapped inputs are never fully loaded
+        num_classes, d, h, w = left.shape
+        slab = max(1, CHUNK_BYTES // (4 * num_classes * h * w))
+        score = np.empty(d, dtype=np.float32)
+        class_diff = np.empty((num_classes, d), dtype=np.float32)
+
+        def scan(start):
+            if check is not None:
+                check()
+            l = np.asarray(left[:, start:start + slab], dtype=np.float32)
+            r = np.asarray(right[:, start:start + slab], dtype=np.float32)
+            n = l.shape[1]
+            score[start:start + n] = (l.argmax(axis=0) != r.argmax(axis=0)).mean(axis=(1, 2))
+            diff = np.subtract(l, r)
+            np.abs(diff, out=diff)
+            class_diff[:, start:start + n] = diff.mean(axis=(2, 3))
+
+        list(get_pool().map(scan, range(0, d, slab)))
+        return cls(score, class_diff)
+
+
+def disagreement_mask(left, right):
+    # left / right are the (C, H, W) logits of one slice
+    return np.asarray(left).argmax(axis=0) != np.asarray(right).argmax(axis=0)
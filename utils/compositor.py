@@ -0,0 +1,73 @@
+import numpy as np
+
+from utils.profiler import profiler
+
+
+class Compositor:
+    # blends slices in 8.8 fixed point into buffers that are reused between frames
+
+    def __init__(self):
+        self.shape = None
+        self.left: np.ndarray = None
+        self.right: np.ndarray = None
+
+    def allocate(self, h, w):
+        if self.shape == (h, w):
+            return
+        self.shape = (h, w)
+        self.left = np.empty((h, w, 3), dtype=np.uint8)
+        self.right = np.empty((h, w, 3), dtype=np.uint8)
+        self._acc = np.empty((h, w, 3), dtype=np.uint16)
+        self._tmp = np.empty((h, w, 3), dtype=np.uint16)
+        self._channel_mask = np.empty((h, w, 3), dtype=bool)
+        self._mask = np.empty((h, w), dtype=bool)
+        self._mask_tmp = np.empty((h, w), dtype=bool)
+
+    def blend(self, dst, rgb, opacity, mask):
+        # dst = dst * opacity + rgb * (1 - opacity) where mask is set
+        alpha = int(round(opacity * 256))
+        np.multiply(dst, alpha, out=self._acc, dtype=np.uint16)
+        np.multiply(rgb, 256 - alpha, out=self._tmp, dtype=np.uint16)
+        self._acc += self._tmp
+        self._acc += 128
+        self._acc >>= 8
+        np.copyto(dst, self._acc, casting='unsafe', where=mask)
+
+    def threshold(self, logits, low, high):
+        np.greater_equal(logits, low, out=self._mask)
+        np.less_equal(logits, high, out=self._mask_tmp)
+        np.logical_and(self._mask, self._mask_tmp, out=self._mask)
+        return self._mask[..., None]
+
+    def compose(self, image, seg_rgb=None, seg_opacity=0.1, logits_left=None, logits_right=None, logits_opacity=0.5,
+                overlay=None):
+        # logits_left / logits_right are (logits, rgb, threshold_low, threshold_high), None for hidden layers.
+        # overlay is (mask, color, opacity), drawn on top of both panes
+        self.allocate(*image.shape)
+        self.left[...] = image[..., None]
+
+        if seg_rgb is not None:
+            with profiler.span("seg blend"):
+                # background (black) channels keep the image, as with the float blend
+                np.greater(seg_rgb, 0, out=self._channel_mask)
+                self.blend(self.left, seg_rgb, seg_opacity, self._channel_mask)
+
+        np.copyto(self.right, self.left)
+        if logits_left is not None:
+            with profiler.span("logits blend left"):
+                logits, rgb, low, high = logits_left
+                self.blend(self.left, rgb, logits_opacity, self.threshold(logits, low, high))
+
+        if logits_right is not None:
+            with profiler.span("logits mask right"):
+                logits, rgb, low, high = logits_right
+                self.right.fill(0)
+                np.copyto(self.right, rgb, where=self.threshold(logits, low, high))
+
+        if overlay is not None:
+            with profiler.span("overlay blend"):
+                mask, color, opacity = overlay
+                self.blend(self.left, color, opacity, mask[..., None])
+                self.blend(self.right, color, opacity, mask[..., None])
+
+        return self.left, self.right
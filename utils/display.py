@@ -0,0 +1,12 @@
+import numpy as np
+from PySide6.QtGui import QImage, QPixmap
+
+
+def array2qimage(arr: np.ndarray) -> QImage:
+    # wraps the rgb buffer without a copy, arr must stay alive while the QImage is used
+    h, w = arr.shape[:2]
+    return QImage(arr.data, w, h, arr.strides[0], QImage.Format_RGB888)
+
+
+def array2qpixmap(arr: np.ndarray) -> QPixmap:
+    return QPixmap.fromImage(array2qimage(arr))
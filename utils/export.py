@@ -0,0 +1,144 @@
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+
+from utils.tools import read_volume, array_range
+from utils.item import ImageItem, SegmentationItem, LogitsItem
+from utils.compositor import Compositor
+from utils.render import render_slice, orient_logits
+from utils.stats import LogitsStats
+
+
+# headless overlay export: slices are composited exactly as in the viewer, on a process pool.
+# Volumes are decoded once and shared with the workers as memory-mapped .npy files.
+
+
+def add_export_parser(subparsers):
+    parser = subparsers.add_parser('export', help="render overlays to PNGs or an MP4 without a display")
+    parser.add_argument('volume', type=str)
+    parser.add_argument('-o', '--output', type=str, required=True, help="a directory for PNGs, or a .mp4 file")
+    parser.add_argument('--seg', type=str, default=None)
+    parser.add_argument('--logits_left', type=str, default=None)
+    parser.add_argument('--logits_right', type=str, default=None, help="defaults to the left logits")
+    parser.add_argument('--pane', choices=['left', 'right', 'both'], default='both')
+    parser.add_argument('--start', type=int, default=0)
+    parser.add_argument('--stop', type=int, default=None)
+    parser.add_argument('--step', type=int, default=1)
+    parser.add_argument('--a_min', type=int, default=-1200)
+    parser.add_argument('--a_max', type=int, default=400)
+    parser.add_argument('--seg_opacity', type=float, default=0.1)
+    parser.add_argument('--logits_opacity', type=float, default=0.5)
+    parser.add_argument('--cls', type=int, default=0)
+    parser.add_argument('--colormap', type=str, default="JET", help="a cv2 colormap name, or NONE")
+    parser.add_argument('--threshold_low', type=float, default=None, help="defaults to the class minimum")
+    parser.add_argument('--threshold_high', type=float, default=None, help="defaults to the class maximum")
+    parser.add_argument('--fps', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    return parser
+
+
+def open_logits(file_name, shape):
+    arr = np.load(file_name, mmap_mode='r')
+    if arr.ndim == 5 and arr.shape[0] == 1:
+        arr = arr[0]
+    return orient_logits(arr, shape)[0]
+
+
+def get_cls_range(file_name, arr, cls):
+    stats = LogitsStats.load(file_name)
+    if stats is not None:
+        return stats.get_range(cls)
+    a_min, a_max = array_range(arr[cls])
+    return float(a_min), float(a_max)
+
+
+def prepare(opt, tmp_dir, volume_cache=None):
+    # decodes the NIfTI files once, everything a worker needs is a path or a number
+    image, _ = read_volume(opt.volume, cache=volume_cache)
+    spec = {"image": os.path.join(tmp_dir, "image.npy"), "image_range": tuple(map(int, array_range(image))),
+            "seg": None, "num_classes": None, "logits": {}}
+    np.save(spec["image"], image)
+    if opt.seg is not None:
+        seg, _ = read_volume(opt.seg, cache=volume_cache)
+        spec["seg"] = os.path.join(tmp_dir, "seg.npy")
+        spec["num_classes"] = int(array_range(seg)[1])
+        np.save(spec["seg"], seg)
+    logits_right = opt.logits_right or opt.logits_left
+    for pos, file_name in (("left", opt.logits_left), ("right", logits_right)):
+        if file_name is not None:
+            spec["logits"][pos] = (file_name, get_cls_range(file_name, open_logits(file_name, image.shape), opt.cls))
+    return spec, image.shape
+
+
+_WORKER = {}
+
+
+def init_worker(opt, spec):
+    image = np.load(spec["image"], mmap_mode='r')
+    _WORKER["image"] = ImageItem(image, opt.volume, spec["image_range"])
+    _WORKER["image"].a_min, _WORKER["image"].a_max = opt.a_min, opt.a_max
+    _WORKER["image"].update_arr()
+
+    _WORKER["seg"] = None
+    if spec["seg"] is not None:
+        _WORKER["seg"] = SegmentationItem(np.load(spec["seg"], mmap_mode='r'), opt.seg, spec["num_classes"])
+        _WORKER["seg"].opacity = opt.seg_opacity
+
+    for pos in ("left", "right"):
+        _WORKER[pos] = None
+        if pos not in spec["logits"]:
+            continue
+        file_name, cls_range = spec["logits"][pos]
+        item = LogitsItem(open_logits(file_name, image.shape), file_name, cache_size=0,
+                          range_dict={opt.cls: cls_range})
+        item.set_cls(opt.cls)
+        item.colormap = opt.colormap
+        item.threshold_low = cls_range[0] if opt.threshold_low is None else opt.threshold_low
+        item.threshold_high = cls_range[1] if opt.threshold_high is None else opt.threshold_high
+        _WORKER[pos] = item
+
+    _WORKER["compositor"] = Compositor()
+    _WORKER["opt"] = opt
+
+
+def render_frame(index):
+    import cv2
+    opt = _WORKER["opt"]
+    left, right = render_slice(index, _WORKER["compositor"], _WORKER["image"], _WORKER["seg"],
+                               _WORKER["left"], _WORKER["right"], opt.logits_opacity)
+    frame = {"left": left, "right": right}.get(opt.pane)
+    if frame is None:
+        frame = np.concatenate([left, right], axis=1)
+    frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    if opt.output.endswith(".mp4"):
+        return index, frame
+    # PNGs are written by the worker, only the index travels back
+    cv2.imwrite(os.path.join(opt.output, f"{index:04d}.png"), frame)
+    return index, None
+
+
+def export(opt, volume_cache=None):
+    import cv2
+    video = opt.output.endswith(".mp4")
+    if not video:
+        os.makedirs(opt.output, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="viewer_export_") as tmp_dir:
+        spec, shape = prepare(opt, tmp_dir, volume_cache)
+        indices = range(opt.start, shape[0] if opt.stop is None else min(opt.stop, shape[0]), opt.step)
+        writer = None
+        # spawned workers do not inherit the parent's threads or file handles
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(max(1, opt.workers), initializer=init_worker, initargs=(opt, spec)) as pool:
+            # ordered and lazily consumed, frames go to disk as they arrive
+            for count, (index, frame) in enumerate(pool.imap(render_frame, indices, chunksize=4), 1):
+                if video:
+                    if writer is None:
+                        writer = cv2.VideoWriter(opt.output, cv2.VideoWriter_fourcc(*"mp4v"), opt.fps,
+                                                 (frame.shape[1], frame.shape[0]))
+                    writer.write(frame)
+                if count % max(1, len(indices) // 10) == 0 or count == len(indices):
+                    print(f"exported {count}/{len(indices)} slices")
+        if writer is not None:
+            writer.release()
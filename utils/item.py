@@ -1,74 +1,198 @@
+import copy
 import os
 
 import numpy as np
 
 from utils.tools import *
+from utils.cache import SliceCache, DEFAULT_CACHE_SIZE, DEFAULT_PYRAMID_CACHE_SIZE
+from utils.stats import LogitsStats
+from utils.planes import PlaneSource
 
 
 class Item:
 
-    def __init__(self, arr, file_path):
-        self._arr = arr
+    def __init__(self, arr, file_path, value_range=None, meta=None, pyramid_cache_size=DEFAULT_PYRAMID_CACHE_SIZE):
         self.file_path = file_path
         self.name = os.path.basename(file_path)
         self.second_name = "/".join(file_path.split("/")[-2:])
-        self.arr = arr.copy()
+        self.arr = arr
         self.opacity: float = 0.1
-        self.max = arr.max()
-        self.min = arr.min()
         self.visible = True
+        # (min, max), scanned lazily or filled in by a background task
+        self.value_range = value_range
+        # spacing / origin / direction as read by SimpleITK (x, y, z order)
+        self.meta: dict = meta or {}
+        self.spacing = tuple(self.meta.get("spacing", (1., 1., 1.)))
+        # downsampled slices for zoomed-out views, keyed by (..., index, level)
+        self.pyramid = SliceCache(pyramid_cache_size)
+
+    def snapshot(self):
+        # shallow copy for render workers: the style, window and threshold attributes are frozen
+        # while the arrays and the thread-safe caches stay shared
+        return copy.copy(self)
+
+    def get_value_range(self):
+        if self.value_range is None:
+            self.value_range = array_range(self.arr)
+        return self.value_range
+
+    @property
+    def max(self):
+        return self.get_value_range()[1]
+
+    @property
+    def min(self):
+        return self.get_value_range()[0]
 
 
 class ImageItem(Item):
 
-    def __init__(self, arr, file_path):
-        super(ImageItem, self).__init__(arr, file_path)
+    def __init__(self, arr, file_path, value_range=None, meta=None, pyramid_cache_size=DEFAULT_PYRAMID_CACHE_SIZE):
+        super(ImageItem, self).__init__(arr, file_path, value_range, meta, pyramid_cache_size)
         self.d, self.h, self.w = arr.shape
         self.a_min: int = -1200
         self.a_max: int = 400
+        self.lut: np.ndarray = None
+        self.planes = PlaneSource(arr)
         self.update_arr()
 
     def update_arr(self):
-        arr = normalize(self._arr, self.a_min, self.a_max)
-        self.arr = np.uint8(arr * 255)
+        # only the window/level table is rebuilt, slices are windowed when drawn.
+        # Until the value range is known slices are scaled directly.
+        if self.value_range is not None and np.issubdtype(self.arr.dtype, np.integer) \
+                and int(self.max) - int(self.min) < MAX_LUT_SIZE:
+            self.lut = window_lut(self.min, self.max, self.a_min, self.a_max)
+        else:
+            self.lut = None
+
+    def get_slice(self, index, level=0, crop=None):
+        # crop is a (rows, columns) pair of slices into a full-resolution slice
+        if crop is not None:
+            return self.window(self.arr[(index,) + crop])
+        if level == 0:
+            return self.window(self.arr[index])
+        # raw values are averaged and then windowed, so window changes keep the cached levels
+        return self.window(self.pyramid.get_or_create((index, level), lambda: downsample(self.arr[index], level)))
+
+    def get_plane(self, axis, index):
+        return self.window(self.planes.get(axis, index))
+
+    def window(self, im):
+        if self.lut is None:
+            return scale_to_uint8(im, self.a_min, self.a_max)
+        # widen just this slice, int16 / uint16 differences may not fit the native dtype
+        return self.lut[np.subtract(im, self.min, dtype=np.int32)]
+
+    def set_value_range(self, value_range):
+        self.value_range = value_range
+        self.update_arr()
 
 
 class SegmentationItem(Item):
 
-    def __init__(self, arr, file_path):
-        super(SegmentationItem, self).__init__(arr, file_path)
-        self.num_classes = arr.max()
-        self.rgb = label2rgb(arr, self.num_classes)
+    def __init__(self, arr, file_path, num_classes=None, meta=None, pyramid_cache_size=DEFAULT_PYRAMID_CACHE_SIZE):
+        super(SegmentationItem, self).__init__(arr, file_path, meta=meta, pyramid_cache_size=pyramid_cache_size)
+        self.num_classes = int(self.max) if num_classes is None else num_classes
+        self.palette = get_palette(self.num_classes)
+        self.planes = PlaneSource(arr)
+
+    def get_rgb(self, index, level=0, crop=None):
+        if crop is not None:
+            return label2rgb(self.arr[(index,) + crop], palette=self.palette)
+        if level == 0:
+            return label2rgb(self.arr[index], palette=self.palette)
+        return self.pyramid.get_or_create(
+            (index, level), lambda: label2rgb(subsample(self.arr[index], level), palette=self.palette))
+
+    def get_plane_rgb(self, axis, index):
+        return label2rgb(self.planes.get(axis, index), palette=self.palette)
 
 
 class LogitsItem(Item):
 
-    def __init__(self, arr, file_path):
-        super(LogitsItem, self).__init__(arr, file_path)
+    def __init__(self, arr, file_path, cache_size: int = DEFAULT_CACHE_SIZE, range_dict=None,
+                 pyramid_cache_size=DEFAULT_PYRAMID_CACHE_SIZE):
+        super(LogitsItem, self).__init__(arr, file_path, pyramid_cache_size=pyramid_cache_size)
         self.opacity = 0.5
         self.threshold_low: int = -100
         self.threshold_high: int = 100
         self.num_class: int = arr.shape[0]
-        self.arr_softmax = np.exp(self.arr)
+        self.logits = arr
         self.dict = {cls: logits for cls, logits in enumerate(arr)}
         # self.mask = np.ones(arr[0].shape, dtype=bool)
-        self.rgb_dict = {}
-        for cls, logits in self.dict.items():
-            self.rgb_dict[cls] = logits2rgb(logits)
-            # self.mask = self.mask & (logits != 0)
+        # colorized slices are built on demand, keyed by (cls, index, colormap)
+        self.colormap: str = "JET"
+        self.range_dict = {} if range_dict is None else dict(range_dict)
+        self.stats: LogitsStats = None
+        self.rgb_cache = SliceCache(cache_size)
+        self.planes: dict = {}
         self.current_cls: int
-        self.rgb: np.ndarray
         self.set_cls(0)
-    
+
     def set_cls(self, cls):
         self.current_cls = cls
         self.arr = self.dict[cls]
-        self.rgb = self.rgb_dict[cls]
 
-    def get_range(self):
-        return (int(self.arr.min()) - 1, int(self.arr.max()) + 1)
+    def get_cls_range(self, cls):
+        if cls not in self.range_dict:
+            a_min, a_max = array_range(self.dict[cls])
+            self.range_dict[cls] = (float(a_min), float(a_max))
+        return self.range_dict[cls]
+
+    def set_stats(self, stats):
+        self.stats = stats
+        self.range_dict.update(stats.get_range_dict())
+
+    def get_slice(self, index, cls=None, level=0, crop=None):
+        # the backing array may be a (transposed) memmap of any float dtype,
+        # so convert just the requested slice
+        cls = self.current_cls if cls is None else cls
+        if crop is not None:
+            return np.asarray(self.dict[cls][(index,) + crop], dtype=np.float32)
+        if level == 0:
+            return np.asarray(self.dict[cls][index], dtype=np.float32)
+        return self.pyramid.get_or_create(
+            (cls, index, level), lambda: downsample(np.asarray(self.dict[cls][index], dtype=np.float32), level))
+
+    def get_planes(self, cls=None):
+        cls = self.current_cls if cls is None else cls
+        if cls not in self.planes:
+            self.planes[cls] = PlaneSource(self.dict[cls])
+        return self.planes[cls]
+
+    def get_plane(self, axis, index, cls=None):
+        return np.asarray(self.get_planes(cls).get(axis, index), dtype=np.float32)
+
+    def get_plane_rgb(self, axis, index, cls=None):
+        cls = self.current_cls if cls is None else cls
+        return logits2rgb(self.get_plane(axis, index, cls), self.colormap, *self.get_cls_range(cls))
+
+    def probe(self, d, h, w):
+        return np.asarray(self.logits[:, d, h, w], dtype=np.float32)
+
+    def get_rgb(self, index, cls=None, level=0, crop=None):
+        cls = self.current_cls if cls is None else cls
+        a_min, a_max = self.get_cls_range(cls)
+        if crop is not None:
+            # crops follow the viewport and are cheap to colorize, they are not cached
+            return logits2rgb(self.get_slice(index, cls, crop=crop), self.colormap, a_min, a_max)
+        return self.rgb_cache.get_or_create(
+            (cls, index, self.colormap, level),
+            lambda: logits2rgb(self.get_slice(index, cls, level), self.colormap, a_min, a_max))
 
-    def set_style(self, colormap):
-        for cls, logits in self.dict.items():
-            self.rgb_dict[cls] = logits2rgb(logits, colormap)
-        self.rgb = self.rgb_dict[self.current_cls]
+    def get_range(self):
+        a_min, a_max = self.get_cls_range(self.current_cls)
+        return (int(a_min) - 1, int(a_max) + 1)
+
+    def set_style(self, colormap, indices=(), level=0):
+        # switching is free: entries of the old colormap age out of the cache and other slices are
+        # colorized when shown. Only the given slices, the shown one and those about to be, are
+        # recolored now, in one batch on the thread pool
+        self.colormap = colormap
+        indices = [index for index in indices if 0 <= index < self.arr.shape[0]]
+        if not indices:
+            return
+        logits = np.stack([self.get_slice(index, level=level) for index in indices])
+        rgb = logits2rgb(logits, colormap, *self.get_cls_range(self.current_cls))
+        for index, im in zip(indices, rgb):
+            self.rgb_cache.put((self.current_cls, index, colormap, level), im)
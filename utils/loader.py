@@ -0,0 +1,186 @@
+import traceback
+
+import numpy as np
+from PySide6.QtCore import QObject, QRunnable, QThread, QThreadPool, Signal, Qt
+from PySide6.QtWidgets import QProgressDialog
+
+from utils.tools import read_volume, array_range
+from utils.stats import LogitsStats
+from utils.occupancy import OccupancyIndex
+from utils.compare import Disagreement
+from utils.metrics import Confusion
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+class LoadSignals(QObject):
+
+    progress = Signal(object, int, str)
+    finished = Signal(object, object)
+    failed = Signal(object, str)
+
+
+class LoadTask(QRunnable):
+
+    def __init__(self, fn, *args, label="", on_finished=None, on_failed=None, quiet=False):
+        super(LoadTask, self).__init__()
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.label: str = label
+        self.on_finished = on_finished
+        self.on_failed = on_failed
+        self.quiet: bool = quiet  # background tasks do not drive the progress dialog
+        self.cancelled: bool = False
+        self.signals = LoadSignals()
+
+    def report(self, percent, text=""):
+        self.signals.progress.emit(self, percent, text)
+        return not self.cancelled
+
+    def check(self):
+        if self.cancelled:
+            raise LoadCancelled()
+
+    def run(self):
+        try:
+            result = self.fn(self, *self.args)
+        except LoadCancelled:
+            result = None
+        except Exception:
+            if self.cancelled:
+                # e.g. an aborted SimpleITK read
+                result = None
+            else:
+                self.signals.failed.emit(self, traceback.format_exc())
+                return
+        self.signals.finished.emit(self, result)
+
+
+class Loader(QObject):
+    # runs LoadTasks on a thread pool, results are handed back on the GUI thread
+
+    def __init__(self, parent):
+        super(Loader, self).__init__(parent)
+        self.pool = QThreadPool(self)
+        # decoding is partly I/O bound, keep a few reads in flight even on small machines
+        self.pool.setMaxThreadCount(max(4, QThread.idealThreadCount()))
+        self.tasks = []
+        self.dialog = QProgressDialog(parent)
+        self.dialog.setWindowTitle("Loading")
+        self.dialog.setWindowModality(Qt.NonModal)
+        self.dialog.setMinimumDuration(300)
+        self.dialog.setAutoClose(False)
+        self.dialog.setAutoReset(False)
+        self.dialog.canceled.connect(self.cancel)
+        self.dialog.reset()
+
+    def submit(self, fn, *args, label="", on_finished=None, on_failed=None, quiet=False) -> LoadTask:
+        task = LoadTask(fn, *args, label=label, on_finished=on_finished, on_failed=on_failed, quiet=quiet)
+        task.signals.progress.connect(self.on_progress)
+        task.signals.finished.connect(self.on_finished)
+        task.signals.failed.connect(self.on_failed)
+        self.tasks.append(task)
+        if not quiet:
+            if self.dialog.wasCanceled():
+                self.dialog.reset()
+            self.dialog.setLabelText(label)
+            self.dialog.setValue(0)
+        self.pool.start(task)
+        return task
+
+    def cancel(self):
+        for task in self.tasks:
+            if not task.quiet:
+                task.cancelled = True
+        self.tasks = [task for task in self.tasks if task.quiet]
+        self.dialog.reset()
+
+    def on_progress(self, task, percent, text):
+        if task.quiet or task.cancelled:
+            return
+        self.dialog.setLabelText(f"{task.label}\n{text}" if text else task.label)
+        self.dialog.setValue(percent)
+
+    def on_finished(self, task, result):
+        self.done(task)
+        if not task.cancelled and task.on_finished is not None:
+            task.on_finished(result)
+
+    def on_failed(self, task, message):
+        self.done(task)
+        print(f"failed to load {task.label}\n{message}")
+        if task.on_failed is not None:
+            task.on_failed(message)
+
+    def done(self, task):
+        if task in self.tasks:
+            self.tasks.remove(task)
+        if all(t.quiet for t in self.tasks):
+            self.dialog.reset()
+
+
+def load_volume(task, file_name, cache=None):
+    result = read_volume(file_name, lambda fraction: task.report(int(fraction * 100), "decoding"), cache)
+    task.check()
+    return result
+
+
+def load_range(task, arr):
+    return array_range(arr)
+
+
+def load_segmentation(task, file_name, cache=None):
+    arr, meta = load_volume(task, file_name, cache)
+    task.report(100, "scanning labels")
+    num_classes = int(array_range(arr)[1])
+    task.check()
+    return arr, meta, num_classes
+
+
+def load_logits(task, file_name, cls=0):
+    # memory-mapped: slicing and transposing are views, pages are read on demand
+    arr = np.load(file_name, mmap_mode='r')
+    if arr.ndim == 5 and arr.shape[0] == 1:
+        arr = arr[0]
+    # class ranges do not depend on the orientation, take them from saved statistics if possible
+    stats = LogitsStats.load(file_name)
+    if stats is not None:
+        return arr, stats.get_range_dict(), stats
+    cls = min(cls, arr.shape[0] - 1)
+    task.report(0, f"scanning class {cls}")
+    a_min, a_max = array_range(arr[cls])
+    task.check()
+    return arr, {cls: (float(a_min), float(a_max))}, None
+
+
+def load_logits_stats(task, arr, file_name, transposed=False):
+    stats = LogitsStats.build(arr, transposed, check=task.check)
+    stats.save(file_name)
+    return stats
+
+
+def load_label_occupancy(task, labels, num_classes):
+    return OccupancyIndex.from_labels(labels, num_classes, check=task.check)
+
+
+def load_logits_occupancy(task, logits, thresholds):
+    return OccupancyIndex.from_logits(logits, thresholds, check=task.check)
+
+
+def load_disagreement(task, left, right):
+    return Disagreement.build(left, right, check=task.check)
+
+
+def load_confusion(task, labels, logits, num_classes=None):
+    return Confusion.from_argmax(labels, logits, num_classes, check=task.check)
+
+
+def load_threshold_confusion(task, labels, logits, label, low, high):
+    return Confusion.from_threshold(labels, logits, label, low, high, check=task.check)
+
+
+def load_planes(task, source, axes):
+    return source.build(axes, check=task.check)
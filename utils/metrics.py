@@ -0,0 +1,89 @@
+import numpy as np
+
+from utils.tools import get_pool
+
+
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def ratio(a, b):
+    # nan where both sides are empty
+    out = np.full(np.shape(a), np.nan)
+    np.divide(a, b, out=out, where=b > 0)
+    return out
+
+
+class Confusion:
+    # per-slice confusion matrices between ground-truth labels and a prediction
+
+    def __init__(self, counts):
+        self.counts: np.ndarray = counts  # (D, C, C) int64, ground truth rows, prediction columns
+
+    @property
+    def num_classes(self):
+        return self.counts.shape[1]
+
+    def totals(self, per_slice=False):
+        # true positives, ground-truth and predicted voxels, (C,) or (C, D) per slice
+        counts = self.counts if per_slice else self.counts.sum(axis=0, keepdims=True)
+        tp = np.diagonal(counts, axis1=1, axis2=2).T
+        gt = counts.sum(axis=2).T
+        pred = counts.sum(axis=1).T
+        if not per_slice:
+            return tp[:, 0], gt[:, 0], pred[:, 0]
+        return tp, gt, pred
+
+    def dice(self, per_slice=False):
+        tp, gt, pred = self.totals(per_slice)
+        return ratio(2 * tp, gt + pred)
+
+    def iou(self, per_slice=False):
+        tp, gt, pred = self.totals(per_slice)
+        return ratio(tp, gt + pred - tp)
+
+    @staticmethod
+    def accumulate(truth, predict, d, num_classes, slab, check=None):
+        # truth(start) / predict(start) return the labels of a depth slab, one bincount per slab
+        counts = np.zeros((d, num_classes, num_classes), dtype=np.int64)
+
+        def scan(start):
+            if check is not None:
+                check()
+            index = truth(start) * num_classes + predict(start)
+            n = index.shape[0]
+            index += (np.arange(n) * num_classes * num_classes)[:, None, None]
+            counts[start:start + n] = np.bincount(index.ravel(), minlength=n * num_classes * num_classes) \
+                .reshape(n, num_classes, num_classes)
+
+        list(get_pool().map(scan, range(0, d, slab)))
+        return counts
+
+    @classmethod
+    def from_argmax(cls, labels, logits, num_classes=None, check=None):
+        # labels (D, H, W) against the argmax of (C, D, H, W) logits, never holding more than a slab of either
+        num_classes = max(num_classes or 0, logits.shape[0])
+        d, h, w = labels.shape
+        slab = max(1, CHUNK_BYTES // (4 * logits.shape[0] * h * w))
+
+        def truth(start):
+            return np.clip(labels[start:start + slab], 0, num_classes - 1).astype(np.int64)
+
+        def predict(start):
+            return np.asarray(logits[:, start:start + slab]).argmax(axis=0)
+
+        return cls(cls.accumulate(truth, predict, d, num_classes, slab, check))
+
+    @classmethod
+    def from_threshold(cls, labels, logits, label, low, high, check=None):
+        # binary: labels == label against low <= logits <= high, for one (D, H, W) class channel
+        d, h, w = labels.shape
+        slab = max(1, CHUNK_BYTES // (4 * h * w))
+
+        def truth(start):
+            return np.equal(labels[start:start + slab], label).astype(np.int64)
+
+        def predict(start):
+            arr = np.asarray(logits[start:start + slab])
+            return ((arr >= low) & (arr <= high)).astype(np.int64)
+
+        return cls(cls.accumulate(truth, predict, d, 2, slab, check))
@@ -0,0 +1,112 @@
+import numpy as np
+
+from utils.tools import get_pool
+
+
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+class OccupancyIndex:
+    # which slices contain each class, and each class's 3D bounding box
+
+    def __init__(self, occupancy, rows, cols):
+        self.occupancy: np.ndarray = occupancy  # (C, D) bool
+        self.rows: np.ndarray = rows            # (C, H) bool
+        self.cols: np.ndarray = cols            # (C, W) bool
+
+    @property
+    def num_classes(self):
+        return self.occupancy.shape[0]
+
+    def slices(self, cls):
+        if cls >= self.num_classes:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.occupancy[cls])
+
+    def next_slice(self, cls, index, step=1):
+        # nearest slice after (step=1) or before (step=-1) index containing cls
+        slices = self.slices(cls)
+        if step > 0:
+            slices = slices[slices > index]
+            return int(slices[0]) if len(slices) else None
+        slices = slices[slices < index]
+        return int(slices[-1]) if len(slices) else None
+
+    def bbox(self, cls):
+        # ((d0, d1), (h0, h1), (w0, w1)), inclusive, None if the class is absent
+        slices = self.slices(cls)
+        if not len(slices):
+            return None
+        rows, cols = np.flatnonzero(self.rows[cls]), np.flatnonzero(self.cols[cls])
+        return (int(slices[0]), int(slices[-1])), (int(rows[0]), int(rows[-1])), (int(cols[0]), int(cols[-1]))
+
+    @staticmethod
+    def get_slab(shape, itemsize):
+        return max(1, CHUNK_BYTES // (itemsize * int(np.prod(shape[-2:]))))
+
+    @classmethod
+    def from_labels(cls, labels, num_classes, check=None):
+        # one pass over depth slabs. Within a slab each slice gets three bincounts (per class, per
+        # class and row, per class and column), so the temporaries stay a few slices in size
+        # however large the slab
+        d, h, w = labels.shape
+        slab = cls.get_slab(labels.shape, labels.dtype.itemsize)
+        occupancy = np.zeros((num_classes, d), dtype=bool)
+        rows = np.zeros((num_classes, h), dtype=bool)
+        cols = np.zeros((num_classes, w), dtype=bool)
+        row_offsets = np.arange(h)[:, None]
+        col_offsets = np.arange(w)[None, :]
+
+        def scan(start):
+            if check is not None:
+                check()
+            arr = np.asarray(labels[start:start + slab])
+            slab_occupancy = np.zeros((num_classes, arr.shape[0]), dtype=bool)
+            slab_rows = np.zeros((num_classes, h), dtype=bool)
+            slab_cols = np.zeros((num_classes, w), dtype=bool)
+            for i, im in enumerate(arr):
+                im = np.clip(im, 0, num_classes - 1).astype(np.intp)
+                slab_occupancy[:, i] = np.bincount(im.ravel(), minlength=num_classes) > 0
+                slab_rows |= np.bincount((im * h + row_offsets).ravel(), minlength=num_classes * h) \
+                    .reshape(num_classes, h) > 0
+                slab_cols |= np.bincount((im * w + col_offsets).ravel(), minlength=num_classes * w) \
+                    .reshape(num_classes, w) > 0
+            return start, slab_occupancy, slab_rows, slab_cols
+
+        for start, slab_occupancy, slab_rows, slab_cols in get_pool().map(scan, range(0, d, slab)):
+            occupancy[:, start:start + slab_occupancy.shape[1]] = slab_occupancy
+            rows |= slab_rows
+            cols |= slab_cols
+        return cls(occupancy, rows, cols)
+
+    @classmethod
+    def from_logits(cls, logits, thresholds, check=None):
+        # thresholds is {cls: (low, high)}, the classes present where low <= logit <= high as in the
+        # overlay. Only those channels are read, in one pass over depth slabs; other classes stay empty
+        num_classes, d, h, w = logits.shape
+        classes = sorted(c for c in thresholds if c < num_classes)
+        occupancy = np.zeros((num_classes, d), dtype=bool)
+        rows = np.zeros((num_classes, h), dtype=bool)
+        cols = np.zeros((num_classes, w), dtype=bool)
+        if not classes:
+            return cls(occupancy, rows, cols)
+        low = np.array([thresholds[c][0] for c in classes], dtype=np.float32)[:, None, None, None]
+        high = np.array([thresholds[c][1] for c in classes], dtype=np.float32)[:, None, None, None]
+        slab = cls.get_slab(logits.shape, 4 * len(classes))
+
+        def scan(start):
+            if check is not None:
+                check()
+            arr = np.asarray(logits[classes, start:start + slab])
+            mask = (arr >= low) & (arr <= high)
+            return start, mask.any(axis=(2, 3)), mask.any(axis=(1, 3)), mask.any(axis=(1, 2))
+
+        for start, slab_occupancy, slab_rows, slab_cols in get_pool().map(scan, range(0, d, slab)):
+            occupancy[classes, start:start + slab_occupancy.shape[1]] = slab_occupancy
+            rows[classes] |= slab_rows
+            cols[classes] |= slab_cols
+        return cls(occupancy, rows, cols)
+
+    def union(self, other):
+        # slices and boxes containing a class in either index
+        return OccupancyIndex(self.occupancy | other.occupancy, self.rows | other.rows, self.cols | other.cols)
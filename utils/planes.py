@@ -0,0 +1,110 @@
+import itertools
+import threading
+
+import numpy as np
+
+from utils.tools import get_pool
+
+
+AXIAL, CORONAL, SAGITTAL = 0, 1, 2
+DEFAULT_PLANE_CACHE_SIZE = 1024 * 1024 * 1024  # bytes
+CHUNK_BYTES = 64 * 1024 * 1024
+# axis order of the reoriented copies, the plane axis first and the rest kept in order
+ORDERS = {CORONAL: (1, 0, 2), SAGITTAL: (2, 0, 1)}
+_TOKENS = itertools.count()
+
+
+class PlaneSource:
+    # 2D slices of a (D, H, W) volume along any axis.
+    # Coronal / sagittal slices of a C-ordered volume are strided, on a memmap they touch
+    # pages across the whole file, so contiguous reoriented copies are used once they exist.
+
+    def __init__(self, arr):
+        self.arr = arr
+        self.copies: dict = {}
+        # unlike id(), never reused by a later source
+        self.token: int = next(_TOKENS)
+
+    def get(self, axis, index):
+        copy = self.copies.get(axis)
+        if copy is not None:
+            return copy[index]
+        if axis == CORONAL:
+            return self.arr[:, index, :]
+        if axis == SAGITTAL:
+            return self.arr[:, :, index]
+        return self.arr[index]
+
+    def missing(self):
+        # sagittal slices are the most scattered, build them first. In-memory coronal slices
+        # are whole rows and read well enough without a copy.
+        axes = [SAGITTAL, CORONAL] if isinstance(self.arr, np.memmap) or not self.arr.flags.c_contiguous \
+            else [SAGITTAL]
+        return [axis for axis in axes if axis not in self.copies]
+
+    @property
+    def copy_nbytes(self):
+        return int(np.prod(self.arr.shape)) * self.arr.dtype.itemsize
+
+    def build(self, axes, check=None):
+        # one sequential pass over depth slabs fills every requested copy
+        d, h, w = self.arr.shape
+        copies = {axis: np.empty(np.take(self.arr.shape, ORDERS[axis]), dtype=self.arr.dtype) for axis in axes}
+        slab = max(1, CHUNK_BYTES // (h * w * self.arr.dtype.itemsize))
+
+        def scan(start):
+            if check is not None:
+                check()
+            arr = np.asarray(self.arr[start:start + slab])
+            for axis, copy in copies.items():
+                copy[:, start:start + arr.shape[0]] = arr.transpose(ORDERS[axis])
+
+        list(get_pool().map(scan, range(0, d, slab)))
+        return copies
+
+
+class PlaneCache:
+    # decides which sources get reoriented copies, in priority order within max_bytes
+
+    def __init__(self, max_bytes: int = DEFAULT_PLANE_CACHE_SIZE):
+        self.max_bytes: int = max_bytes
+        self.sources: dict = {}  # token -> source holding copies
+        self.pending: dict = {}  # token -> bytes reserved for a build in flight
+        self.wanted: set = set()
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return sum(copy.nbytes for source in self.sources.values() for copy in source.copies.values())
+
+    def plan(self, sources):
+        # returns [(source, axes)] to build. Copies of sources no longer shown are dropped first.
+        with self.lock:
+            self.wanted = {source.token for source in sources}
+            for key in [key for key in self.sources if key not in self.wanted]:
+                self.sources.pop(key).copies = {}
+            budget = self.max_bytes - self.nbytes - sum(self.pending.values())
+            plans = []
+            for source in sources:
+                if source.token in self.pending:
+                    continue
+                axes = []
+                for axis in source.missing():
+                    if source.copy_nbytes <= budget:
+                        axes.append(axis)
+                        budget -= source.copy_nbytes
+                if axes:
+                    self.pending[source.token] = source.copy_nbytes * len(axes)
+                    plans.append((source, axes))
+            return plans
+
+    def put(self, source, copies):
+        with self.lock:
+            self.pending.pop(source.token, None)
+            if source.token in self.wanted and copies:
+                source.copies.update(copies)
+                self.sources[source.token] = source
+
+    def release(self, source):
+        with self.lock:
+            self.pending.pop(source.token, None)
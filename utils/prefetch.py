@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.compositor import Compositor
+
+
+class SlicePrefetcher:
+    # composites the slices ahead of the scroll direction on a worker pool
+
+    def __init__(self, render, snapshot, workers: int = 2, depth: int = 8, horizon: float = 0.25):
+        # render(index, compositor, params) -> (left, right) buffers owned by compositor.
+        # snapshot() -> params is called on the GUI thread, workers never read the live state
+        self.render = render
+        self.snapshot = snapshot
+        self.depth: int = depth
+        self.horizon: float = horizon  # seconds of scrolling to look ahead at the current speed
+        self.enabled: bool = workers > 0 and depth > 0
+        self.generation: int = 0
+        self.direction: int = 1
+        self.speed: float = 0.
+        self.hits: int = 0
+        self.misses: int = 0
+        self._last_index = None
+        self._last_time = None
+        self._jobs = {}  # index -> (generation, future)
+        self._params = None  # snapshot of the current generation, taken when its first job is queued
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=workers) if self.enabled else None
+
+    def invalidate(self):
+        # rendering parameters changed, every queued or finished frame is stale
+        self.generation += 1
+        self._params = None
+        for _, future in self._jobs.values():
+            future.cancel()
+        self._jobs.clear()
+
+    def _compose(self, index, generation, params):
+        if generation != self.generation:
+            return None
+        compositor = getattr(self._local, "compositor", None)
+        if compositor is None:
+            compositor = self._local.compositor = Compositor()
+        left, right = self.render(index, compositor, params)
+        return left.copy(), right.copy()
+
+    def take(self, index):
+        job = self._jobs.pop(index, None)
+        if job is None or job[0] != self.generation or job[1].cancelled():
+            self.misses += 1
+            return None
+        future = job[1]
+        if not future.done():
+            # still queued or rendering, the GUI thread renders it itself rather than wait
+            future.cancel()
+            self.misses += 1
+            return None
+        frame = future.result()
+        if frame is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return frame
+
+    def update(self, index, num_slices):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self._last_index is not None and index != self._last_index:
+            delta = index - self._last_index
+            self.direction = 1 if delta > 0 else -1
+            elapsed = max(now - self._last_time, 1e-3)
+            self.speed = 0.5 * self.speed + 0.5 * abs(delta) / elapsed
+        self._last_index, self._last_time = index, now
+
+        ahead = min(self.depth, max(2, int(round(self.speed * self.horizon))))
+        wanted = [index + self.direction * step for step in range(1, ahead + 1)]
+        wanted = [i for i in wanted if 0 <= i < num_slices]
+
+        # drop jobs that fell out of the look-ahead window
+        for i in list(self._jobs):
+            if i not in wanted:
+                self._jobs.pop(i)[1].cancel()
+        for i in wanted:
+            if i not in self._jobs:
+                if self._params is None:
+                    self._params = self.snapshot()
+                self._jobs[i] = (self.generation,
+                                 self._executor.submit(self._compose, i, self.generation, self._params))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self.invalidate()
+            self._executor.shutdown(wait=False, cancel_futures=True)
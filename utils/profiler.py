@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+
+MAX_EVENTS = 200000  # spans kept for the trace, the oldest are dropped
+NULL_SPAN = nullcontext()
+
+
+class Span:
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.start, time.perf_counter_ns() - self.start)
+
+
+class Profiler:
+    # named timing spans around the render stages. Disabled, span() hands out one shared
+    # no-op context manager, so instrumented code pays an attribute check and a call.
+
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self.enabled: bool = False
+        self.events = deque(maxlen=max_events)  # (name, start_ns, duration_ns, thread id)
+        self.frames = deque(maxlen=240)  # perf_counter_ns at the end of each frame
+        self.totals: dict = {}  # name -> [total_ns, count] since the last breakdown()
+        self.lock = threading.Lock()
+        self.origin: int = time.perf_counter_ns()
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def add(self, name, start, duration):
+        self.events.append((name, start, duration, threading.get_ident()))
+        with self.lock:
+            total = self.totals.setdefault(name, [0, 0])
+            total[0] += duration
+            total[1] += 1
+
+    def frame(self):
+        if self.enabled:
+            self.frames.append(time.perf_counter_ns())
+
+    def fps(self):
+        # frames shown during the last second
+        now = time.perf_counter_ns()
+        return sum(1 for t in self.frames if now - t < 1e9)
+
+    def breakdown(self):
+        # {name: (mean ms, calls)} since the previous call
+        with self.lock:
+            totals, self.totals = self.totals, {}
+        return {name: (total / count / 1e6, count) for name, (total, count) in totals.items()}
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        if not enabled:
+            self.frames.clear()
+
+    def dump(self, file_name):
+        # Chrome trace-event format, open in chrome://tracing or ui.perfetto.dev
+        events = [{"name": name, "ph": "X", "ts": (start - self.origin) / 1e3, "dur": duration / 1e3,
+                   "pid": os.getpid(), "tid": tid} for name, start, duration, tid in list(self.events)]
+        with open(file_name, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+profiler = Profiler()
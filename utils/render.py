@@ -0,0 +1,62 @@
+import numpy as np
+
+from utils.profiler import profiler
+
+
+# the composition shared by the viewer and the headless export, free of Qt
+
+
+def orient_logits(arr, shape):
+    # logits saved in (C, W, H, D) order are flipped back to the volume's (C, D, H, W)
+    if arr.shape[1:] != tuple(shape):
+        return np.transpose(arr, (0, 3, 2, 1)), True
+    return arr, False
+
+
+def choose_crop(visible, shape, crop=None, margin=0.25):
+    # (rows, columns) slices to composite for the visible (y0, y1, x0, x1) voxels of a (h, w) slice,
+    # None for the whole slice. The current crop is kept while it still covers the view
+    # and is not much larger than needed
+    y0, y1, x0, x1 = visible
+    h, w = shape
+    if y1 <= y0 or x1 <= x0:
+        return None
+    area = (y1 - y0) * (x1 - x0)
+    if crop is not None:
+        rows, columns = crop
+        if rows.start <= y0 and y1 <= rows.stop and columns.start <= x0 and x1 <= columns.stop \
+                and (rows.stop - rows.start) * (columns.stop - columns.start) <= 4 * area:
+            return crop
+    my, mx = int((y1 - y0) * margin) + 1, int((x1 - x0) * margin) + 1
+    rows, columns = slice(max(0, y0 - my), min(h, y1 + my)), slice(max(0, x0 - mx), min(w, x1 + mx))
+    if (rows.stop - rows.start) * (columns.stop - columns.start) >= h * w // 2:
+        # most of the slice is visible, cropping would save little
+        return None
+    return rows, columns
+
+
+def get_logits_layer(logits, index, level=0, crop=None):
+    if logits is None or not logits.visible:
+        return None
+    with profiler.span("logits colorize"):
+        return (logits.get_slice(index, level=level, crop=crop), logits.get_rgb(index, level=level, crop=crop),
+                logits.threshold_low, logits.threshold_high)
+
+
+def render_slice(index, compositor, image, seg=None, logits_left=None, logits_right=None, logits_opacity=0.5,
+                 overlay=None, level=0, crop=None):
+    # returns the (left, right) panes, views into the compositor's buffers
+    with profiler.span("window/level"):
+        im = image.get_slice(index, level, crop)
+    seg_rgb = None
+    if seg is not None and seg.visible:
+        with profiler.span("seg colorize"):
+            seg_rgb = seg.get_rgb(index, level, crop)
+
+    return compositor.compose(
+        im,
+        seg_rgb, seg.opacity if seg_rgb is not None else 0,
+        get_logits_layer(logits_left, index, level, crop),
+        get_logits_layer(logits_right, index, level, crop),
+        logits_opacity,
+        overlay)
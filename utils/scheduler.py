@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+
+from PySide6.QtCore import QObject, QTimer
+
+
+class RenderScheduler(QObject):
+    # coalesces render requests, at most one render per event-loop turn (or interval in ms).
+    # With debounce the interval restarts on every request, so a burst renders once after it ends
+
+    def __init__(self, render, interval: int = 0, parent=None, debounce: bool = False):
+        super(RenderScheduler, self).__init__(parent)
+        self.render = render
+        self.debounce: bool = debounce
+        self.dirty: bool = False
+        self.rendered: int = 0
+        self.skipped: int = 0
+        self._depth: int = 0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.flush)
+
+    def request(self):
+        if self.dirty:
+            # a render is already pending and will pick up this change too
+            self.skipped += 1
+            if self.debounce and self._depth == 0:
+                self._timer.start()
+            return
+        self.dirty = True
+        if self._depth == 0:
+            self._timer.start()
+
+    @contextmanager
+    def transaction(self):
+        # requests made inside the block collapse into a single render after it
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0 and self.dirty:
+                self._timer.start()
+
+    def flush(self):
+        self._timer.stop()
+        if not self.dirty:
+            return
+        self.dirty = False
+        self.rendered += 1
+        self.render()
@@ -0,0 +1,117 @@
+import os
+
+import numpy as np
+
+from utils.tools import get_pool
+
+
+STATS_VERSION = 1
+NUM_BINS = 64
+CHUNK_BYTES = 64 * 1024 * 1024  # float32 bytes per slab and worker
+
+
+class LogitsStats:
+    # per-class, per-slice min / max / mean and fixed-bin histograms of a (C, D, H, W) logits volume
+
+    def __init__(self, slice_min, slice_max, slice_mean, hist, edges, transposed=False):
+        self.slice_min: np.ndarray = slice_min    # (C, D)
+        self.slice_max: np.ndarray = slice_max    # (C, D)
+        self.slice_mean: np.ndarray = slice_mean  # (C, D)
+        self.hist: np.ndarray = hist              # (C, D, NUM_BINS)
+        self.edges: np.ndarray = edges            # (C, NUM_BINS + 1), class-wide bin edges
+        self.transposed: bool = transposed
+
+    @property
+    def num_classes(self):
+        return self.slice_min.shape[0]
+
+    def get_range(self, cls):
+        return float(self.slice_min[cls].min()), float(self.slice_max[cls].max())
+
+    def get_range_dict(self):
+        return {cls: self.get_range(cls) for cls in range(self.num_classes)}
+
+    def get_class_hist(self, cls):
+        return self.hist[cls].sum(axis=0), self.edges[cls]
+
+    @staticmethod
+    def get_slab(shape):
+        # depth slices per task, CHUNK_BYTES of float32 across every class
+        return max(1, CHUNK_BYTES // (4 * (int(np.prod(shape)) // shape[1])))
+
+    @staticmethod
+    def get_path(file_name):
+        return file_name + ".stats.npz"
+
+    @staticmethod
+    def get_key(file_name):
+        stat = os.stat(file_name)
+        return np.array([STATS_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    def save(self, file_name):
+        try:
+            with open(self.get_path(file_name), "wb") as f:
+                np.savez(f, key=self.get_key(file_name), slice_min=self.slice_min, slice_max=self.slice_max,
+                         slice_mean=self.slice_mean, hist=self.hist, edges=self.edges,
+                         transposed=np.array(self.transposed))
+        except OSError as e:
+            print(f"could not save logits statistics: {e}")
+
+    @classmethod
+    def load(cls, file_name):
+        path = cls.get_path(file_name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                if not np.array_equal(data["key"], cls.get_key(file_name)):
+                    return None
+                return cls(data["slice_min"], data["slice_max"], data["slice_mean"], data["hist"],
+                           data["edges"], bool(data["transposed"]))
+        except (OSError, KeyError, ValueError):
+            return None
+
+    @classmethod
+    def build(cls, arr, transposed=False, num_bins=NUM_BINS, check=None):
+        # two chunked passes over depth slabs on the thread pool: min / max / mean,
+        # then histograms over the class-wide ranges found by the first pass
+        num_classes, d = arr.shape[:2]
+        slab = cls.get_slab(arr.shape)
+        starts = range(0, d, slab)
+
+        slice_min = np.empty((num_classes, d), dtype=np.float32)
+        slice_max = np.empty((num_classes, d), dtype=np.float32)
+        slice_mean = np.empty((num_classes, d), dtype=np.float32)
+        hist = np.zeros((num_classes, d, num_bins), dtype=np.int64)
+
+        def read(start):
+            if check is not None:
+                check()
+            logits = np.asarray(arr[:, start:start + slab], dtype=np.float32)
+            return logits.reshape(num_classes, logits.shape[1], -1)
+
+        def reduce(start):
+            logits = read(start)
+            stop = start + logits.shape[1]
+            logits.min(axis=2, out=slice_min[:, start:stop])
+            logits.max(axis=2, out=slice_max[:, start:stop])
+            logits.mean(axis=2, out=slice_mean[:, start:stop])
+
+        list(get_pool().map(reduce, starts))
+
+        lo, hi = slice_min.min(axis=1), slice_max.max(axis=1)
+        edges = np.linspace(lo, hi, num_bins + 1, axis=1).astype(np.float32)
+        scale = (num_bins / np.maximum(hi - lo, 1e-12)).astype(np.float32)
+
+        def histogram(start):
+            logits = read(start)
+            n = logits.shape[1]
+            bins = (logits - lo[:, None, None]) * scale[:, None, None]
+            bins = np.clip(bins, 0, num_bins - 1).astype(np.int64)
+            # one bincount for every (class, slice) pair of the slab
+            bins += (np.arange(num_classes * n).reshape(num_classes, n, 1) * num_bins)
+            counts = np.bincount(bins.ravel(), minlength=num_classes * n * num_bins)
+            hist[:, start:start + n] = counts.reshape(num_classes, n, num_bins)
+
+        list(get_pool().map(histogram, starts))
+        return cls(slice_min, slice_max, slice_mean, hist, edges, transposed)
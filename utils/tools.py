@@ -1,8 +1,10 @@
-import SimpleITK as sitk
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-import cv2
-from monai.transforms import ScaleIntensityRange
-import matplotlib.pyplot as plt
+
+# SimpleITK and cv2 are imported where they are first needed, they would otherwise
+# load before the window appears
 
 PALETTE = [[0, 0, 0], [180, 120, 120], [6, 230, 230], [80, 50, 50],
            [4, 200, 3], [120, 120, 80], [204, 5, 255],
@@ -20,51 +22,175 @@ PALETTE = [[0, 0, 0], [180, 120, 120], [6, 230, 230], [80, 50, 50],
            [255, 31, 0], [255, 224, 0], [153, 255, 0], [0, 0, 255],
            [255, 71, 0], [0, 235, 255], [0, 173, 255], [31, 0, 255]]
 
-def get_array_from_file(file_path):
-    image = sitk.ReadImage(file_path)
-    arr = sitk.GetArrayFromImage(image).astype(np.int32)
+NONE_PALETTE = np.array(PALETTE[1:] * 4, dtype=np.uint8)
+SLAB_SIZE = 8
+MAX_LUT_SIZE = 1 << 20
+COLORMAP_LUTS = {}
+COLORMAP_JET = 2  # cv2.COLORMAP_JET
+_POOL = None
+
+def get_pool():
+    # cv2 and numpy release the GIL, so threads are enough to use every core
+    global _POOL
+    if _POOL is None:
+        _POOL = ThreadPoolExecutor(max_workers=os.cpu_count())
+    return _POOL
+
+def read_volume(file_path, progress=None, cache=None):
+    # returns (arr, meta), repeat opens are served as memory maps from the VolumeCache
+    if cache is not None:
+        cached = cache.get(file_path)
+        if cached is not None:
+            return cached
+    import SimpleITK as sitk
+    reader = sitk.ImageFileReader()
+    reader.SetFileName(file_path)
+    if progress is not None:
+        # progress(fraction) returns False to abort the read
+        def on_progress():
+            if not progress(reader.GetProgress()):
+                reader.Abort()
+        reader.AddCommand(sitk.sitkProgressEvent, on_progress)
+    image = reader.Execute()
+    # keep the on-disk dtype (int16 CT, uint8 labels, ...), slices are widened when drawn
+    arr = sitk.GetArrayFromImage(image)
+    meta = {
+        "spacing": list(image.GetSpacing()),
+        "origin": list(image.GetOrigin()),
+        "direction": list(image.GetDirection()),
+    }
+    if cache is not None:
+        # a cache miss is not slowed down by writing the entry
+        cache.put_later(file_path, arr, meta)
+    return arr, meta
+
+def get_array_from_file(file_path, progress=None, cache=None):
+    arr, _ = read_volume(file_path, progress, cache)
     return arr
 
 def normalize(data, a_min, a_max):
-    transform = ScaleIntensityRange(a_min=a_min, a_max=a_max, b_min=0, b_max=1, clip=True)
-    return transform(data).numpy()
-
-def label2rgb(arr, num_classes):
-    d, h, w = arr.shape
-    rgb_arr = np.zeros([d, h, w, 3], dtype=np.uint8)
-    for cls in range(num_classes+1):
-        rgb_arr[arr==cls] = PALETTE[cls]
-    return rgb_arr
-
-def get_heatmap(mask: np.ndarray, use_rgb: bool = True, colormap: int = cv2.COLORMAP_JET) -> np.ndarray:
-    # cv2.COLORMAP_
-    heatmap = cv2.applyColorMap(np.uint8(255 * mask), colormap)
-    if use_rgb:
-        heatmap = cv2.cvtColor(heatmap, cv2.COLOR_BGR2RGB)
-    return heatmap
-
-def logits2rgb(arr, colormap="JET"):
-    if colormap == "NONE":
-        arr = arr.copy().astype(np.int16)
-        palette = PALETTE[1:] * 4
-        res = np.zeros(list(arr.shape)+[3], dtype=np.uint8)
-        for i in range(arr.min(), arr.max() + 1):
-            res[arr == i] = palette[i]
+    # [a_min, a_max] -> [0, 1], clipped
+    res = np.subtract(data, a_min, dtype=np.float32)
+    if a_max != a_min:
+        res /= a_max - a_min
+    np.clip(res, 0, 1, out=res)
+    return res
+
+def get_palette(num_classes):
+    # PALETTE has 57 entries, labels beyond that get fixed pseudo-random colors
+    palette = np.array(PALETTE, dtype=np.uint8)
+    if num_classes + 1 > len(palette):
+        rng = np.random.RandomState(len(PALETTE))
+        extra = rng.randint(0, 256, size=(num_classes + 1 - len(palette), 3)).astype(np.uint8)
+        palette = np.concatenate([palette, extra])
+    return palette
+
+def label2rgb(arr, num_classes=None, palette=None):
+    # single lookup pass, works on a whole volume or on a single slice
+    if not np.issubdtype(arr.dtype, np.integer):
+        arr = arr.astype(np.int64)
+    if palette is None:
+        num_classes = int(arr.max()) if num_classes is None else num_classes
+        palette = get_palette(num_classes)
+    return np.take(palette, arr, axis=0, mode='clip')
+
+def get_colormap_lut(colormap: int = COLORMAP_JET) -> np.ndarray:
+    # 256 x 3 RGB table, built once per cv2 colormap
+    if colormap not in COLORMAP_LUTS:
+        import cv2
+        lut = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(256, 1), colormap)
+        COLORMAP_LUTS[colormap] = np.ascontiguousarray(lut[:, 0, ::-1])
+    return COLORMAP_LUTS[colormap]
+
+def get_heatmap(mask: np.ndarray, use_rgb: bool = True, colormap: int = COLORMAP_JET) -> np.ndarray:
+    lut = get_colormap_lut(colormap)
+    if not use_rgb:
+        lut = lut[:, ::-1]
+    return lut[np.uint8(255 * mask)]
+
+def scale_to_uint8(arr, a_min, a_max):
+    scale = 255 / (a_max - a_min) if a_max > a_min else 0.
+    res = np.subtract(arr, a_min, dtype=np.float32)
+    res *= scale
+    np.clip(res, 0, 255, out=res)
+    return res.astype(np.uint8)
+
+def window_lut(v_min, v_max, a_min, a_max):
+    # intensity -> uint8 table covering every integer value in [v_min, v_max]
+    values = np.arange(int(v_min), int(v_max) + 1, dtype=np.float32)
+    return scale_to_uint8(values, a_min, a_max)
+
+def array_range(arr):
+    if arr.ndim < 3 or arr.shape[0] <= SLAB_SIZE:
+        return arr.min(), arr.max()
+    ranges = list(get_pool().map(lambda start: (arr[start:start + SLAB_SIZE].min(), arr[start:start + SLAB_SIZE].max()),
+                                 range(0, arr.shape[0], SLAB_SIZE)))
+    return min(r[0] for r in ranges), max(r[1] for r in ranges)
+
+def logits2rgb(arr, colormap="JET", a_min=None, a_max=None):
+    if arr.ndim > 2 and arr.shape[0] > SLAB_SIZE:
+        # split volumes into slabs and colorize them on the thread pool
+        if colormap != "NONE" and (a_min is None or a_max is None):
+            v_min, v_max = array_range(arr)
+            a_min = v_min if a_min is None else a_min
+            a_max = v_max if a_max is None else a_max
+        res = np.empty(arr.shape + (3,), dtype=np.uint8)
+
+        def colorize(start):
+            res[start:start + SLAB_SIZE] = logits2rgb(arr[start:start + SLAB_SIZE], colormap, a_min, a_max)
+
+        list(get_pool().map(colorize, range(0, arr.shape[0], SLAB_SIZE)))
         return res
 
-    transform = ScaleIntensityRange(a_min=arr.min(), a_max=arr.max(), b_min=0, b_max=1, clip=True)
-    arr = transform(arr)
-    res = [get_heatmap(im) for im in arr]
-    return np.array(res)
+    if colormap == "NONE":
+        # integer logit values index the palette directly, negative values wrap around
+        return np.take(NONE_PALETTE, arr.astype(np.int16) % len(NONE_PALETTE), axis=0)
+
+    # the range is passed in when colorizing part of a larger volume
+    a_min = arr.min() if a_min is None else a_min
+    a_max = arr.max() if a_max is None else a_max
+    import cv2
+    lut = get_colormap_lut(getattr(cv2, "COLORMAP_" + colormap))
+    return lut[scale_to_uint8(arr, a_min, a_max)]
 
-def softmax(arr, axis):
-    import torch
-    return torch.softmax(torch.tensor(arr), 0).numpy()
-    exp = np.exp(arr)
-    res = exp / arr.max(axis=axis, keepdims=True)
+def get_level(ratio, shape=None):
+    # pyramid level whose 2 ** level downsampling best matches a zoom ratio below 1
+    level = max(0, int(np.floor(np.log2(1 / ratio) + 1e-6)))
+    if shape is not None:
+        level = min(level, int(np.log2(max(1, min(shape)))))
+    return level
+
+def downsample(arr, level):
+    # area average, the right filter for shrinking images and logits
+    if level == 0:
+        return arr
+    f = 1 << level
+    h, w = arr.shape[:2]
+    dtype = arr.dtype
+    if dtype not in (np.uint8, np.int16, np.uint16, np.float32):
+        # other dtypes are averaged in float, 32 / 64-bit integers need float64 to stay exact
+        arr = arr.astype(np.float64 if dtype.itemsize > 2 else np.float32)
+    import cv2
+    res = cv2.resize(np.ascontiguousarray(arr), (-(-w // f), -(-h // f)), interpolation=cv2.INTER_AREA)
+    if np.issubdtype(dtype, np.integer) and res.dtype != dtype:
+        # integer volumes keep their dtype, the window/level table is indexed by value
+        res = np.rint(res).astype(dtype)
     return res
 
+def subsample(arr, level):
+    # labels must not be averaged, take every 2 ** level-th voxel instead
+    if level == 0:
+        return arr
+    f = 1 << level
+    return np.ascontiguousarray(arr[::f, ::f])
+
+def softmax(arr, axis):
+    exp = np.exp(arr - arr.max(axis=axis, keepdims=True))
+    exp /= exp.sum(axis=axis, keepdims=True)
+    return exp
+
 if __name__ == '__main__':
+    import matplotlib.pyplot as plt
     # seg = sitk.ReadImage("/Users/chaos/Downloads/artery/unet_spacing/train_1/0_000/0_000_pred1.nii.gz")
     # seg = sitk.ReadImage("/Users/chaos/Downloads/small_unet_192/val1/img0035/img0035_pred.nii.gz")
     # seg = sitk.ReadImage("/Users/chaos/Downloads/small_unet_192/val1/img0035/img0035_pred.nii.gz")
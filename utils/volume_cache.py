@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+DEFAULT_VOLUME_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "viewer", "volumes")
+DEFAULT_VOLUME_CACHE_SIZE = 20 * 1024 ** 3  # bytes
+CACHE_FORMAT = 2  # bump when the stored arrays change meaning
+
+
+class VolumeCache:
+    # decompressed volumes as raw .npy files that reopen as memory maps
+
+    def __init__(self, cache_dir: str = DEFAULT_VOLUME_CACHE_DIR, max_bytes: int = DEFAULT_VOLUME_CACHE_SIZE):
+        self.cache_dir: str = cache_dir
+        self.max_bytes: int = max_bytes
+        # one writer, entries are stored and evicted in order. Its thread is joined at exit,
+        # so pending writes still finish
+        self._writer = ThreadPoolExecutor(max_workers=1)
+
+    def key(self, file_path):
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        key = f"{CACHE_FORMAT}|{file_path}|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".npy", base + ".json"
+
+    def get(self, file_path):
+        try:
+            arr_path, meta_path = self.paths(self.key(file_path))
+            if not (os.path.exists(arr_path) and os.path.exists(meta_path)):
+                return None
+            with open(meta_path) as f:
+                meta = json.load(f)
+            arr = np.load(arr_path, mmap_mode='r')
+            # the modification time doubles as the last-used time for eviction
+            os.utime(arr_path)
+        except (OSError, ValueError):
+            return None
+        return arr, meta
+
+    def put_later(self, file_path, arr, meta):
+        # writes in the background, the caller can hand arr on without waiting for the disk
+        return self._writer.submit(self.put, file_path, arr, meta)
+
+    def put(self, file_path, arr, meta):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            arr_path, meta_path = self.paths(self.key(file_path))
+            # write under temporary names so readers never see partial files
+            with open(arr_path + ".tmp", "wb") as f:
+                np.save(f, arr)
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(meta, f)
+            os.replace(meta_path + ".tmp", meta_path)
+            os.replace(arr_path + ".tmp", arr_path)
+            self.evict()
+        except OSError as e:
+            print(f"volume cache: {e}")
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npy"):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for p in (path, path[:-len(".npy")] + ".json"):
+                if os.path.exists(p):
+                    os.remove(p)
+            total -= size